@@ -0,0 +1,71 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+import typing
+
+from benchmarks.synthetic import RecordWriter
+from legends_explorer.legends import definitions
+from legends_explorer.legends.reader import readers, get_reader, scan_document
+
+
+def write_sample(file_path: str, records: int, seed: int):
+    writer = RecordWriter(random.Random(seed), density=0.3)
+    with open(file_path, 'w') as f:
+        f.write('<?xml version="1.0" encoding=\'UTF-8\'?>\n<df_world>\n')
+        for name, collection in definitions.items():
+            f.write(f'<{name}>\n')
+            for key in range(records):
+                f.write(writer.record('record', collection.root, key))
+                f.write('\n')
+            f.write(f'</{name}>\n')
+        f.write('</df_world>\n')
+
+
+def parse_file(backend: str, file_path: str) -> typing.Tuple[str, typing.Dict[str, typing.List[dict]]]:
+    reader = get_reader(backend)
+    parsed = {}
+    for tag, elem in reader.read_records(scan_document(file_path).select(lambda t: t in definitions)):
+        parsed.setdefault(tag, []).append(definitions[tag].root.parse(elem))
+    return reader.name, parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that every XML backend parses a dump identically')
+    parser.add_argument('files', nargs='*', help='Legends XML files, a synthetic sample is generated if omitted')
+    parser.add_argument('--records', type=int, default=500, help='Records per collection in the sample')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = args.files
+        if not files:
+            files = [os.path.join(tmp_dir, 'sample-legends.xml')]
+            write_sample(files[0], args.records, args.seed)
+        failed = False
+        for file_path in files:
+            expected = None
+            for backend in readers:
+                start = time.perf_counter()
+                name, parsed = parse_file(backend, file_path)
+                elapsed = time.perf_counter() - start
+                if name != backend:
+                    print(f'{file_path}: {backend} is not available, skipped')
+                    continue
+                if expected is None:
+                    expected = parsed
+                    status = 'reference'
+                elif parsed == expected:
+                    status = 'identical'
+                else:
+                    failed = True
+                    status = 'DIFFERENT: ' + ', '.join(sorted(tag for tag in set(parsed) | set(expected)
+                                                            if parsed.get(tag) != expected.get(tag)))
+                count = sum(len(entities) for entities in parsed.values())
+                print(f'{file_path}: {backend} {count} records in {elapsed:.3f}s, {status}')
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
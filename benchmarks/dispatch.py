@@ -0,0 +1,74 @@
+import argparse
+import random
+import time
+from xml.etree.ElementTree import Element, fromstring
+
+from benchmarks.synthetic import RecordWriter
+from legends_explorer.legends import definitions
+from legends_explorer.legends.types import Entity, BasicType, ComplexType
+
+
+def legacy_parse(self: Entity, elem: Element):
+    fields = {}
+    for child in elem:  # type: Element
+        tag = child.tag
+        if self._transforms is not None and tag in self._transforms:
+            tag = self._transforms[tag]
+        if tag in self._fields:
+            if tag in fields:
+                print('*** Duplicated key', elem.tag, tag)
+            p_type = self._fields[tag]
+            if isinstance(p_type, BasicType):
+                fields[tag] = p_type.parse(child)
+            elif isinstance(p_type, ComplexType):
+                p_type.parse(child, parent_fields=fields)
+        else:
+            for group in self._group_trees:
+                if group.test(tag):
+                    group.parse(child, parent_fields=fields)
+                    break
+            else:
+                print('*** Missing def', elem.tag, tag)
+    return fields
+
+
+def measure(entity: Entity, records: Element, rounds: int):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for record in records:
+            entity.parse(record)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare legacy and compiled Entity dispatch')
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--density', type=float, default=0.6, help='Probability of each optional field')
+    parser.add_argument('collections', nargs='*', default=['historical_figures', 'historical_events'])
+    args = parser.parse_args()
+    writer = RecordWriter(random.Random(args.seed), density=args.density)
+    compiled_parse = Entity.parse
+    for name in args.collections:
+        entity = definitions[name].root
+        records = fromstring(f'<{name}>' + ''.join(writer.record('record', entity, key)
+                                                    for key in range(args.records)) + f'</{name}>')
+        Entity.parse = legacy_parse
+        try:
+            expected = [entity.parse(record) for record in records]
+            legacy = measure(entity, records, args.rounds)
+        finally:
+            Entity.parse = compiled_parse
+        if expected != [entity.parse(record) for record in records]:
+            raise AssertionError(f'{name}: compiled dispatch output differs from legacy dispatch')
+        compiled = measure(entity, records, args.rounds)
+        print(f'{name}: {args.records} records, legacy {legacy:.3f}s ({args.records / legacy:.0f} rec/s), '
+              f'compiled {compiled:.3f}s ({args.records / compiled:.0f} rec/s), speedup x{legacy / compiled:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import json
+import resource
+import tempfile
+import time
+import typing
+
+import bson
+
+from benchmarks.synthetic import DumpWriter
+from legends_explorer.legends import Collection, definitions
+from legends_explorer.legends.reader import get_reader, scan_document, Document
+
+
+class Timings:
+    def __init__(self, name: str):
+        self.name = name
+        self.records = 0
+        self.merged = 0
+        self.bytes = 0
+        self.read = 0.
+        self.parse = 0.
+        self.merge = 0.
+        self.dump = 0.
+        self.insert = 0.
+        self.peak_rss = 0
+
+    @property
+    def total(self):
+        return self.read + self.parse + self.merge + self.dump + self.insert
+
+    def report(self) -> dict:
+        total = self.total or float('inf')
+        return {
+            'collection': self.name, 'records': self.records, 'merged': self.merged, 'bytes': self.bytes,
+            'read': self.read, 'parse': self.parse, 'merge': self.merge, 'dump': self.dump, 'insert': self.insert,
+            'records_per_s': self.records / total, 'mb_per_s': self.bytes / 1024 / 1024 / total,
+            'peak_rss_mb': self.peak_rss / 1024
+        }
+
+
+def peak_rss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def section_of(document: Document, name: str) -> Document:
+    return document.select(lambda tag: tag == name)
+
+
+def run_collection(name: str, documents: typing.List[Document], backend: str, *,
+                   compact: bool, db=None) -> Timings:
+    timings = Timings(name)
+    collection = Collection(name, definitions[name].root)
+    collection.configure(compact=compact)
+    root = collection.root
+    reader = get_reader(backend)
+    for override, document in enumerate(documents):
+        document = section_of(document, name)
+        timings.bytes += sum(len(section) for section in document.sections)
+        start = time.perf_counter()
+        parse = merge = 0.
+        for _, elem in reader.read_records(document):
+            parse_start = time.perf_counter()
+            entity = root.parse(elem)
+            merge_start = time.perf_counter()
+            collection.add(entity)
+            merge_end = time.perf_counter()
+            parse += merge_start - parse_start
+            if override:
+                merge += merge_end - merge_start
+                timings.merged += 1
+            else:
+                timings.records += 1
+        timings.read += time.perf_counter() - start - parse - merge
+        timings.parse += parse
+        timings.merge += merge
+    start = time.perf_counter()
+    encoded = [bson.encode(entity) for entity in collection.entities()]
+    timings.dump = time.perf_counter() - start
+    if db is not None:
+        start = time.perf_counter()
+        if encoded:
+            db[name].insert_many([bson.decode(data) for data in encoded], ordered=False)
+        timings.insert = time.perf_counter() - start
+    timings.peak_rss = peak_rss()
+    return timings
+
+
+def print_table(results: typing.List[Timings], elapsed: float):
+    print(f'{"collection":<22}{"records":>9}{"merged":>8}{"MB":>8}{"read":>8}{"parse":>8}{"merge":>8}'
+          f'{"dump":>8}{"insert":>8}{"rec/s":>10}{"MB/s":>8}{"rss MB":>8}')
+    for timings in results:
+        r = timings.report()
+        print(f'{r["collection"]:<22}{r["records"]:>9}{r["merged"]:>8}{r["bytes"] / 1024 / 1024:>8.2f}'
+              f'{r["read"]:>8.3f}{r["parse"]:>8.3f}{r["merge"]:>8.3f}{r["dump"]:>8.3f}{r["insert"]:>8.3f}'
+              f'{r["records_per_s"]:>10.0f}{r["mb_per_s"]:>8.2f}{r["peak_rss_mb"]:>8.1f}')
+    records = sum(t.records for t in results)
+    size = sum(t.bytes for t in results) / 1024 / 1024
+    print(f'total: {records} records, {size:.2f} MB in {elapsed:.3f}s '
+          f'({records / elapsed:.0f} records/s, {size / elapsed:.2f} MB/s), peak RSS {peak_rss() / 1024:.1f} MB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the legends importer on a synthetic dump')
+    parser.add_argument('collections', nargs='*', help='Collections to import, all of them if omitted')
+    parser.add_argument('--records', type=int, default=20000, help='Total records in the generated dump')
+    parser.add_argument('--size-mb', type=float, help='Target size of the legends file, overrides --records')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend', choices=['etree', 'lxml', 'sax'], default='etree')
+    parser.add_argument('--compact', action='store_true', help='Keep parsed entities in their compact form')
+    parser.add_argument('--folder', help='Keep the generated dump in this folder')
+    parser.add_argument('--region', default='region1')
+    parser.add_argument('--mongo-url', help='Also insert into a throwaway legends_benchmark database')
+    parser.add_argument('--json', help='Write the results to this file')
+    args = parser.parse_args()
+
+    names = args.collections or list(definitions)
+    writer = DumpWriter({name: definitions[name].root for name in names}, seed=args.seed)
+    counts = writer.counts_for_size(int(args.size_mb * 1024 * 1024)) if args.size_mb else writer.counts(args.records)
+
+    db = client = None
+    if args.mongo_url:
+        import pymongo
+        client = pymongo.MongoClient(args.mongo_url)
+        client.drop_database('legends_benchmark')
+        db = client['legends_benchmark']
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        legends_path, plus_path = writer.write(args.folder or tmp_dir, args.region, counts)
+        print(f'generated {sum(counts.values())} records in {time.perf_counter() - start:.3f}s')
+        documents = [scan_document(legends_path), scan_document(plus_path)]
+        start = time.perf_counter()
+        results = [run_collection(name, documents, args.backend, compact=args.compact, db=db) for name in names]
+        elapsed = time.perf_counter() - start
+
+    if client is not None:
+        client.drop_database('legends_benchmark')
+    print_table(results, elapsed)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'backend': args.backend, 'compact': args.compact, 'elapsed': elapsed,
+                       'peak_rss_mb': peak_rss() / 1024, 'collections': [t.report() for t in results]}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import random
+import time
+from xml.etree.ElementTree import fromstring
+
+from benchmarks.synthetic import RecordWriter
+from legends_explorer.legends import definitions
+from legends_explorer.legends.types import Entity, List, GroupBy, LinkToPreviousGroupBy
+
+
+def legacy_entity_merge(self: Entity, origin, override):
+    new_obj = {}
+    for key, value in self:
+        if isinstance(value, (GroupBy, LinkToPreviousGroupBy)):
+            key = value.group_key
+        if key in origin and key not in override:
+            new_obj[key] = origin[key]
+        elif key not in origin and key in override:
+            new_obj[key] = override[key]
+        elif key in origin and key in override:
+            new_obj[key] = value.merge(origin[key], override[key])
+    return new_obj
+
+
+def legacy_list_merge(self: List, origin, override):
+    new_list = []
+    origin_items = dict(map(lambda e: (e[self._elem.merge_id], e), origin))
+    override_items = dict(map(lambda e: (e[self._elem.merge_id], e), override))
+    for _id in origin_items | override_items:
+        if _id in origin_items and _id not in override_items:
+            new_list.append(origin_items[_id])
+        elif _id not in origin_items and _id in override_items:
+            new_list.append(override_items[_id])
+        elif _id in origin_items and _id in override_items:
+            new_list.append(self._elem.merge(origin_items[_id], override_items[_id]))
+    return new_list
+
+
+def legacy_group_merge(self: GroupBy, origin, override):
+    new_grp = []
+    if isinstance(self._elem, Entity):
+        return origin
+    for elem in origin:
+        if elem not in override:
+            new_grp.append(elem)
+    for elem in override:
+        new_grp.append(elem)
+    return new_grp
+
+
+legacy = {Entity: legacy_entity_merge, List: legacy_list_merge, GroupBy: legacy_group_merge}
+
+
+def measure(entity: Entity, pairs, rounds: int):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for origin, override in pairs:
+            entity.merge(origin, override)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare legacy and key based merges of legends and legends_plus')
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--density', type=float, default=0.6, help='Probability of each optional field')
+    parser.add_argument('--group-size', type=int, default=4, help='Average number of items in a group')
+    parser.add_argument('--overlap', action='store_true',
+                        help='Write every field in both files instead of splitting them like the real dumps')
+    parser.add_argument('collections', nargs='*', default=['historical_figures', 'entities', 'historical_events'])
+    args = parser.parse_args()
+    writer = RecordWriter(random.Random(args.seed), density=args.density, group_size=args.group_size)
+    current = {p_type: p_type.merge for p_type in legacy}
+    for name in args.collections:
+        entity = definitions[name].root
+        if args.overlap:
+            records = [(writer.record('record', entity, key), writer.record('record', entity, key))
+                       for key in range(args.records)]
+        else:
+            records = [writer.pair('record', entity, key) for key in range(args.records)]
+        pairs = [(entity.parse(fromstring(origin)), entity.parse(fromstring(override)))
+                 for origin, override in records]
+        for p_type, merge in legacy.items():
+            p_type.merge = merge
+        try:
+            before = measure(entity, pairs, args.rounds)
+        finally:
+            for p_type, merge in current.items():
+                p_type.merge = merge
+        after = measure(entity, pairs, args.rounds)
+        print(f'{name}: {args.records} merges, legacy {before:.3f}s ({args.records / before:.0f} merges/s), '
+              f'key based {after:.3f}s ({args.records / after:.0f} merges/s), speedup x{before / after:.2f}')
+
+
+if __name__ == '__main__':
+    main()
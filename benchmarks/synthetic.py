@@ -0,0 +1,171 @@
+import os
+import random
+import typing
+
+from legends_explorer.legends.types import (
+    ParsingType, Bool, Int, Float, Str, SplitStr, Population, Coordinates, Path, Rectangle, Entity, List,
+    GroupBy, LinkToPreviousGroupBy, Wrap
+)
+
+WORDS = ['dwarf', 'elf', 'goblin', 'human', 'forest', 'mountain', 'river', 'temple', 'member', 'mother',
+         'father', 'child', 'spouse', 'fire', 'water', 'death', 'war', 'peace', 'iron', 'silver']
+
+WEIGHTS = {
+    'historical_events': 60, 'historical_figures': 15, 'artifacts': 4, 'sites': 3, 'entities': 2,
+    'entity_populations': 2, 'identities': 2, 'regions': 1, 'underground_regions': 1, 'landmasses': 1,
+    'mountain_peaks': 1, 'rivers': 1, 'world_constructions': 1, 'creature_raw': 1
+}
+
+RECORD_TAGS = {
+    'entities': 'entity', 'identities': 'identity', 'creature_raw': 'creature', 'historical_events': 'historical_event'
+}
+
+HEADER = '<?xml version="1.0" encoding=\'UTF-8\'?>\n<df_world>\n'
+
+
+def record_tag(section: str) -> str:
+    if section in RECORD_TAGS:
+        return RECORD_TAGS[section]
+    return section[:-1] if section.endswith('s') else section
+
+
+class RecordWriter:
+    def __init__(self, rng: random.Random, *, density: float = 0.6, group_size: int = 4, path_length: int = 20,
+                 max_fields: int = None):
+        self._rng = rng
+        self._density = density
+        self._group_size = group_size
+        self._path_length = path_length
+        self._max_fields = max_fields
+
+    def record(self, tag: str, entity: Entity, key: int,
+               include: typing.Callable[[str], bool] = None) -> str:
+        lines = [f'<{tag}>']
+        self._entity(lines, entity, key, include)
+        lines.append(f'</{tag}>')
+        return '\n'.join(lines)
+
+    def pair(self, tag: str, entity: Entity, key: int) -> typing.Tuple[str, str]:
+        plus_fields = {name for name, _ in entity if self._rng.random() < 0.5}
+        plus_fields.update(group.start for group in entity.group_trees if self._rng.random() < 0.5)
+        return (self.record(tag, entity, key, lambda name: name not in plus_fields),
+                self.record(tag, entity, key, lambda name: name in plus_fields))
+
+    def _density_of(self, entity: Entity):
+        if self._max_fields is None:
+            return self._density
+        return min(self._density, self._max_fields / max(1, len(list(entity))))
+
+    def _entity(self, lines: typing.List[str], entity: Entity, key: int = None,
+                include: typing.Callable[[str], bool] = None):
+        density = self._density_of(entity)
+        links: typing.Dict[str, typing.List[typing.Tuple[str, LinkToPreviousGroupBy]]] = {}
+        for name, p_type in entity:
+            if isinstance(p_type, LinkToPreviousGroupBy):
+                links.setdefault(p_type.group_key, []).append((name, p_type))
+        for name, p_type in entity:
+            if name == entity.merge_id:
+                value = key if key is not None else self._rng.randrange(10000)
+                lines.append(f'<{name}>{value if isinstance(p_type, Int) else f"{name}{value}"}</{name}>')
+            elif isinstance(p_type, LinkToPreviousGroupBy) or self._rng.random() >= density:
+                continue
+            elif include is not None and not include(name):
+                continue
+            elif isinstance(p_type, GroupBy):
+                for _ in range(self._rng.randint(1, self._group_size)):
+                    self._field(lines, name, p_type.elem)
+                    for link_name, link in links.get(p_type.group_key, []):
+                        if self._rng.random() < density:
+                            self._field(lines, link_name, link.elem)
+            else:
+                self._field(lines, name, p_type)
+        for group in entity.group_trees:
+            if self._rng.random() < density and (include is None or include(group.start)):
+                suffix = '_'.join(self._rng.sample(WORDS, group.depth))
+                self._field(lines, f'{group.start}{suffix}', group.elem)
+
+    def _field(self, lines: typing.List[str], name: str, p_type: ParsingType):
+        if isinstance(p_type, Bool):
+            lines.append(f'<{name}/>')
+        elif isinstance(p_type, Entity):
+            lines.append(f'<{name}>')
+            self._entity(lines, p_type)
+            lines.append(f'</{name}>')
+        elif isinstance(p_type, List):
+            lines.append(f'<{name}>')
+            for index in range(self._rng.randint(1, self._group_size)):
+                lines.append('<item>')
+                self._entity(lines, p_type.elem, index)
+                lines.append('</item>')
+            lines.append(f'</{name}>')
+        elif isinstance(p_type, Wrap):
+            self._field(lines, name, p_type.elem)
+        else:
+            lines.append(f'<{name}>{self._value(p_type)}</{name}>')
+
+    def _value(self, p_type: ParsingType):
+        rng = self._rng
+        if isinstance(p_type, Int):
+            return str(rng.randrange(10000))
+        if isinstance(p_type, Float):
+            return str(rng.random() * 100)
+        if isinstance(p_type, SplitStr):
+            return p_type.char.join(rng.sample(WORDS, 3))
+        if isinstance(p_type, Population):
+            return f'{rng.choice(WORDS)}:{rng.randrange(1000)}'
+        if isinstance(p_type, Coordinates):
+            return f'{rng.randrange(256)},{rng.randrange(256)}'
+        if isinstance(p_type, Rectangle):
+            return ':'.join(f'{rng.randrange(256)},{rng.randrange(256)}' for _ in range(2))
+        if isinstance(p_type, Path):
+            points = rng.randint(1, self._path_length)
+            return ''.join(','.join(str(rng.randrange(256)) for _ in range(p_type.points)) + '|'
+                           for _ in range(points))
+        if isinstance(p_type, Str):
+            return rng.choice(WORDS)
+        raise ValueError(f'No synthetic value for {type(p_type).__name__}')
+
+
+class DumpWriter:
+    def __init__(self, schemas: typing.Dict[str, Entity], *, seed: int = 0, plus_ratio: float = 0.6,
+                 max_fields: int = 12, path_length: int = 200):
+        self._schemas = schemas
+        self._rng = random.Random(seed)
+        self._plus_ratio = plus_ratio
+        self._writer = RecordWriter(self._rng, density=0.6, max_fields=max_fields, path_length=path_length)
+
+    def counts(self, records: int) -> typing.Dict[str, int]:
+        total = sum(WEIGHTS.get(name, 1) for name in self._schemas)
+        return {name: max(1, records * WEIGHTS.get(name, 1) // total) for name in self._schemas}
+
+    def counts_for_size(self, size: int, sample: int = 50) -> typing.Dict[str, int]:
+        weighted = 0
+        for name, entity in self._schemas.items():
+            tag = record_tag(name)
+            average = sum(len(self._writer.pair(tag, entity, key)[0]) for key in range(sample)) / sample
+            weighted += average * WEIGHTS.get(name, 1)
+        total = sum(WEIGHTS.get(name, 1) for name in self._schemas)
+        return self.counts(int(size * total / weighted))
+
+    def write(self, folder: str, region: str, counts: typing.Dict[str, int]) -> typing.Tuple[str, str]:
+        os.makedirs(folder, exist_ok=True)
+        legends_path = os.path.join(folder, f'{region}-legends.xml')
+        plus_path = os.path.join(folder, f'{region}-legends_plus.xml')
+        with open(legends_path, 'w') as legends, open(plus_path, 'w') as plus:
+            legends.write(HEADER)
+            plus.write(HEADER)
+            for name, count in counts.items():
+                entity = self._schemas[name]
+                tag = record_tag(name)
+                legends.write(f'<{name}>\n')
+                plus.write(f'<{name}>\n')
+                for key in range(count):
+                    legends_record, plus_record = self._writer.pair(tag, entity, key)
+                    legends.write(legends_record + '\n')
+                    if self._rng.random() < self._plus_ratio:
+                        plus.write(plus_record + '\n')
+                legends.write(f'</{name}>\n')
+                plus.write(f'</{name}>\n')
+            legends.write('</df_world>\n')
+            plus.write('</df_world>\n')
+        return legends_path, plus_path
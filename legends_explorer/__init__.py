@@ -1,3 +1,4 @@
 import legends_explorer.init
 import legends_explorer.commands
+import legends_explorer.controllers
 from legends_explorer.app import create_bolinette
@@ -7,9 +7,55 @@ from legends_explorer.legends import LegendsParser
 @command('parse_legends', 'Parse Dwarf Fortress legends from XML dumps')
 @command.argument('argument', 'folder', summary='Legends folder name')
 @command.argument('option', 'parse', flag='p', summary='Parses collections, comma-separated or *')
+@command.argument('option', 'world', flag='w', summary='Imports into a database of its own for this world')
 @command.argument('option', 'drop', flag='d', summary='Drops collections before processing, comma-separated or *')
 @command.argument('flag', 'insert', flag='i', summary='Inserts data into database')
-async def parse_legends(context: blnt.BolinetteContext, folder: str, parse: str, drop: str, insert: bool):
-    parser = LegendsParser(context)
+@command.argument('flag', 'sync', flag='s',
+                  summary='Only writes the entities that changed since the last import of this region')
+@command.argument('flag', 'cache', flag='k',
+                  summary='Reuses parsed collections cached next to the XML files while they are unchanged')
+@command.argument('flag', 'summaries', flag='m',
+                  summary='Also writes per figure, site and entity summaries built from the parsed collections')
+@command.argument('flag', 'events', flag='e',
+                  summary='Also writes event_index, the sorted ids of the events referencing each figure, site, '
+                          'entity and artifact')
+@command.argument('flag', 'timeline', flag='t',
+                  summary='Sorts historical_events chronologically and also writes timeline, per year and decade '
+                          'counts of events by type')
+@command.argument('flag', 'graph', flag='r',
+                  summary='Also writes hf_graph, the links between figures, entities and sites, for relationship '
+                          'queries')
+@command.argument('flag', 'codes', flag='n',
+                  summary='Stores categories such as races, castes and types as integer codes, listed in categories')
+@command.argument('option', 'batch', flag='b', value_type=int,
+                  summary='Streams entities to database while parsing, in batches of this size')
+@command.argument('option', 'jobs', flag='j', value_type=int, summary='Parses files in this many processes, at least 2')
+@command.argument('option', 'backend', flag='x', choices=['etree', 'lxml', 'sax'],
+                  summary='XML parser backend, lxml falls back to etree when not installed')
+@command.argument('flag', 'compact', flag='c', summary='Keeps parsed entities in a compact in-memory form')
+@command.argument('option', 'paths', flag='g', choices=['points', 'packed', 'geojson'],
+                  summary='Storage format of coordinate paths, defaults to points')
+@command.argument('option', 'export', flag='o', choices=['parquet'],
+                  summary='Exports the parsed collections to this format, in the export folder next to the XML files')
+@command.argument('option', 'profile', summary='Writes per-collection timings and counters to this JSON file')
+@command.argument('option', 'cprofile', summary='Writes cProfile stats of the import and parse workers to this file')
+@command.argument('flag', 'memory', summary='Tracks peak memory of the import and parse workers in the profile report')
+async def parse_legends(context: blnt.BolinetteContext, folder: str, parse: str, world: str, drop: str,
+                        insert: bool, sync: bool, cache: bool, summaries: bool, events: bool, timeline: bool,
+                        graph: bool, codes: bool, batch: int, jobs: int, backend: str, compact: bool, paths: str,
+                        export: str, profile: str, cprofile: str, memory: bool):
+    parser = LegendsParser(context, world=world)
     path = context.root_path('df_dumps', folder)
-    await parser.parse(path, folder, parse=parse, drop=drop, insert=insert)
+    await parser.parse(path, folder, parse=parse, drop=drop, insert=insert, sync=sync, cache=cache,
+                       summaries=summaries, event_index=events, timeline=timeline, graph=graph, codes=codes,
+                       batch=batch, jobs=jobs, backend=backend, compact=compact, path_format=paths or 'points',
+                       export=export, profile=profile, cprofile=cprofile, trace_memory=memory)
+
+
+@command('build_indexes', 'Build the indexes declared in the legends definitions')
+@command.argument('option', 'collections', flag='p', summary='Indexes collections, comma-separated or *')
+@command.argument('option', 'world', flag='w', summary='Indexes the database of this world')
+@command.argument('flag', 'rebuild', flag='r', summary='Drops existing indexes before building them')
+async def build_indexes(context: blnt.BolinetteContext, collections: str, world: str, rebuild: bool):
+    parser = LegendsParser(context, world=world)
+    await parser.index(collections, rebuild=rebuild)
@@ -0,0 +1,276 @@
+import typing
+
+from aiohttp import web as aio_web
+from aiohttp.web_request import Request
+from bolinette import web
+from bolinette.decorators import controller, get
+from bolinette.exceptions import BadRequestError, NotFoundError
+from bolinette.utils.serializing import serialize
+
+from legends_explorer.legends import LegendsQueries, spatial
+from legends_explorer.legends.graph import node_kinds
+from legends_explorer.legends.queries import Cached
+from legends_explorer.legends.references import event_references
+from legends_explorer.legends.timeline import scales
+
+
+class ReadController(web.Controller):
+    @property
+    def queries(self) -> LegendsQueries:
+        return self.context['df_queries']
+
+    @staticmethod
+    def _fields(query: typing.Dict[str, str]) -> typing.Optional[typing.Tuple[str, ...]]:
+        if not query.get('fields'):
+            return None
+        fields = tuple(sorted(set(query['fields'].split(','))))
+        for field in fields:
+            if not field or field.startswith('_') or '$' in field:
+                raise BadRequestError(f'legends.field.invalid:{field}')
+        return fields
+
+    @staticmethod
+    def _limit(query: typing.Dict[str, str]) -> int:
+        try:
+            limit = int(query.get('limit', 50))
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            raise BadRequestError(f'legends.limit.invalid:{query["limit"]}')
+        return limit
+
+    @staticmethod
+    def _int(query: typing.Dict[str, str], name: str, default: int = None) -> typing.Optional[int]:
+        if name not in query:
+            if default is None:
+                raise BadRequestError(f'param.required:{name}')
+            return default
+        try:
+            return int(query[name])
+        except ValueError:
+            raise BadRequestError(f'legends.{name}.invalid:{query[name]}')
+
+    def _world(self, query: typing.Dict[str, str]) -> typing.Optional[str]:
+        world = query.get('world')
+        if world is not None:
+            try:
+                self.queries.connection(world)
+            except ValueError as e:
+                raise BadRequestError(str(e))
+        return world
+
+    def _respond(self, cached: Cached, request: Request):
+        etag = f'"{cached.etag}"'
+        headers = {'ETag': etag, 'Cache-Control': f'max-age={int(self.queries.cache.ttl)}'}
+        if etag in (tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')):
+            return aio_web.Response(status=304, headers=headers)
+        serialized, mime = serialize(self.response.ok(data=cached.data).content, 'application/json')
+        return aio_web.Response(text=serialized, status=200, content_type=mime, headers=headers)
+
+
+@controller('legends', '/legends', use_service=False)
+class LegendsController(ReadController):
+    def _collection(self, name: str):
+        if not self.queries.readable(name):
+            raise NotFoundError(f'legends.collection.not_found:{name}')
+        return name
+
+    def _key(self, name: str, value: str):
+        try:
+            return self.queries.parse_key(name, value)
+        except ValueError:
+            raise BadRequestError(f'legends.key.invalid:{value}')
+
+    @get('/{collection}')
+    async def get_page(self, match, query, request):
+        """
+        Gets the documents of a collection sorted by id, after the id given in the after query parameter
+        """
+        name = self._collection(match['collection'])
+        after = self._key(name, query['after']) if 'after' in query else None
+        cached = await self.queries.page(name, world=self._world(query), after=after, limit=self._limit(query),
+                                         fields=self._fields(query))
+        return self._respond(cached, request)
+
+    @get('/{collection}/{key}')
+    async def get_document(self, match, query, request):
+        """
+        Gets one document of a collection by id
+        """
+        name = self._collection(match['collection'])
+        key = self._key(name, match['key'])
+        cached = await self.queries.document(name, key, world=self._world(query), fields=self._fields(query))
+        if cached is None:
+            raise NotFoundError(f'legends.document.not_found:{name}:{match["key"]}')
+        return self._respond(cached, request)
+
+
+@controller('map', '/map', use_service=False)
+class MapController(ReadController):
+    max_cells = 1024
+
+    def _layers(self, query: typing.Dict[str, str]) -> typing.List[str]:
+        if not query.get('layers'):
+            return self.queries.layers
+        layers = list(dict.fromkeys(query['layers'].split(',')))
+        for layer in layers:
+            if layer not in self.queries.layers:
+                raise NotFoundError(f'legends.layer.not_found:{layer}')
+        return layers
+
+    async def _viewport(self, box: spatial.Box, query: typing.Dict[str, str], request: Request):
+        x0, y0, x1, y1 = box
+        if x0 < 0 or y0 < 0 or x1 < x0 or y1 < y0:
+            raise BadRequestError(f'legends.viewport.invalid:{x0},{y0},{x1},{y1}')
+        size = spatial.tile_size
+        if (x1 // size - x0 // size + 1) * (y1 // size - y0 // size + 1) > self.max_cells:
+            raise BadRequestError(f'legends.viewport.too_large:{x0},{y0},{x1},{y1}')
+        cached = await self.queries.viewport(box, layers=self._layers(query), world=self._world(query),
+                                             fields=self._fields(query))
+        return self._respond(cached, request)
+
+    @get('')
+    async def get_viewport(self, query, request):
+        """
+        Gets the documents of every map layer whose bounding box intersects the x0, y0, x1, y1 viewport
+        """
+        try:
+            box = tuple(int(query[bound]) for bound in ('x0', 'y0', 'x1', 'y1'))
+        except (KeyError, ValueError):
+            raise BadRequestError('legends.viewport.invalid')
+        return await self._viewport(box, query, request)
+
+    @get('/tiles/{x}/{y}')
+    async def get_tile(self, match, query, request):
+        """
+        Gets the documents of every map layer intersecting one map cell
+        """
+        try:
+            tile_x, tile_y = int(match['x']), int(match['y'])
+        except ValueError:
+            raise BadRequestError(f'legends.tile.invalid:{match["x"]},{match["y"]}')
+        size = spatial.tile_size
+        box = tile_x * size, tile_y * size, (tile_x + 1) * size - 1, (tile_y + 1) * size - 1
+        return await self._viewport(box, query, request)
+
+
+@controller('timeline', '/timeline', use_service=False)
+class TimelineController(ReadController):
+    @staticmethod
+    def _types(query: typing.Dict[str, str]) -> typing.Optional[typing.Tuple[str, ...]]:
+        if not query.get('types'):
+            return None
+        return tuple(sorted(set(query['types'].split(','))))
+
+    @staticmethod
+    def _participant(query: typing.Dict[str, str]) -> typing.Optional[typing.Tuple[str, int]]:
+        kinds = [kind for kind in event_references if kind in query]
+        if not kinds:
+            return None
+        if len(kinds) > 1:
+            raise BadRequestError(f'legends.participant.too_many:{",".join(kinds)}')
+        kind = kinds[0]
+        try:
+            return kind, int(query[kind])
+        except ValueError:
+            raise BadRequestError(f'legends.{kind}.invalid:{query[kind]}')
+
+    def _range(self, query: typing.Dict[str, str]) -> typing.Tuple[int, int]:
+        start, end = self._int(query, 'start'), self._int(query, 'end')
+        if end < start:
+            raise BadRequestError(f'legends.range.invalid:{start},{end}')
+        return start, end
+
+    @get('')
+    async def get_histogram(self, query, request):
+        """
+        Gets the number of events by type of each year or decade between the start and end years
+        """
+        start, end = self._range(query)
+        scale = query.get('scale', 'year')
+        if scale not in scales:
+            raise BadRequestError(f'legends.scale.invalid:{scale}')
+        cached = await self.queries.histogram(start, end, scale=scale, types=self._types(query),
+                                              world=self._world(query))
+        return self._respond(cached, request)
+
+    @get('/events')
+    async def get_events(self, query, request):
+        """
+        Gets the events between the start and end years in chronological order, filtered by types and by one
+        hf, site, entity or artifact they reference
+        """
+        start, end = self._range(query)
+        after = self._int(query, 'after') if 'after' in query else None
+        cached = await self.queries.events(start, end, types=self._types(query), participant=self._participant(query),
+                                           after=after, limit=self._limit(query), fields=self._fields(query),
+                                           world=self._world(query))
+        return self._respond(cached, request)
+
+
+@controller('graph', '/graph', use_service=False)
+class GraphController(ReadController):
+    max_hops = 4
+
+    @staticmethod
+    def _hfid(value: str) -> int:
+        try:
+            return int(value)
+        except ValueError:
+            raise BadRequestError(f'legends.hfid.invalid:{value}')
+
+    @staticmethod
+    def _through(query: typing.Dict[str, str]) -> typing.Tuple[str, ...]:
+        if not query.get('through'):
+            return 'hf',
+        kinds = tuple(sorted(set(query['through'].split(',')) | {'hf'}))
+        for kind in kinds:
+            if kind not in node_kinds:
+                raise BadRequestError(f'legends.through.invalid:{kind}')
+        return kinds
+
+    def _hops(self, query: typing.Dict[str, str], name: str, default: int) -> int:
+        hops = self._int(query, name, default)
+        if hops <= 0 or hops > self.max_hops:
+            raise BadRequestError(f'legends.{name}.invalid:{hops}')
+        return hops
+
+    @staticmethod
+    def _found(cached: typing.Optional[Cached], *hfids: int) -> Cached:
+        if cached is None:
+            raise NotFoundError(f'legends.graph.not_found:{",".join(map(str, hfids))}')
+        return cached
+
+    @get('/{hfid}/family')
+    async def get_family(self, match, query, request):
+        """
+        Gets the parents, children and spouses of a figure, and theirs up to depth links away
+        """
+        hfid = self._hfid(match['hfid'])
+        cached = await self.queries.neighborhood(hfid, self._hops(query, 'depth', 2), family=True,
+                                                 world=self._world(query))
+        return self._respond(self._found(cached, hfid), request)
+
+    @get('/{hfid}/neighborhood')
+    async def get_neighborhood(self, match, query, request):
+        """
+        Gets the figures up to hops links away from a figure, also going through the entities and sites given in
+        the through query parameter
+        """
+        hfid = self._hfid(match['hfid'])
+        cached = await self.queries.neighborhood(hfid, self._hops(query, 'hops', 1), kinds=self._through(query),
+                                                 world=self._world(query))
+        return self._respond(self._found(cached, hfid), request)
+
+    @get('/{hfid}/path/{target}')
+    async def get_path(self, match, query, request):
+        """
+        Gets the shortest chain of links between two figures
+        """
+        source, target = self._hfid(match['hfid']), self._hfid(match['target'])
+        max_depth = self._int(query, 'max_depth', 6)
+        if max_depth <= 0 or max_depth > 12:
+            raise BadRequestError(f'legends.max_depth.invalid:{max_depth}')
+        cached = await self.queries.path(source, target, kinds=self._through(query), max_depth=max_depth,
+                                         world=self._world(query))
+        return self._respond(self._found(cached, source, target), request)
@@ -1,9 +1,19 @@
 from bolinette import blnt
 from bolinette.decorators import init_func
 
-from legends_explorer.legends import LegendsConnection
+from legends_explorer.legends import LegendsConnection, LegendsQueries, ReadCache
 
 
 @init_func
 def init_legends_mongo(context: blnt.BolinetteContext):
-    context['df_mongo'] = LegendsConnection(context.env['legends_mongo_url'], context.env['legends_mongo_database'])
+    context['df_mongo'] = LegendsConnection(context.env['legends_mongo_url'], context.env['legends_mongo_database'],
+                                            pool_size=int(context.env.get('legends_mongo_pool_size', 100)),
+                                            concurrency=int(context.env.get('legends_mongo_concurrency', 8)))
+
+
+@init_func
+def init_legends_queries(context: blnt.BolinetteContext):
+    cache = ReadCache(max_size=int(context.env.get('legends_cache_size', 1024)),
+                      ttl=float(context.env.get('legends_cache_ttl', 60)))
+    context['df_queries'] = LegendsQueries(context['df_mongo'], cache,
+                                           max_limit=int(context.env.get('legends_page_limit', 500)))
@@ -1,4 +1,7 @@
 from legends_explorer.legends.mongo import LegendsConnection
+from legends_explorer.legends.writer import BatchWriter
+from legends_explorer.legends.export import ParquetSink
 from legends_explorer.legends.collection import Collection
 from legends_explorer.legends.definitions import definitions
 from legends_explorer.legends.parser import LegendsParser
+from legends_explorer.legends.queries import LegendsQueries, ReadCache
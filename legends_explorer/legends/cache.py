@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import typing
+
+import bson
+
+from legends_explorer.legends import types
+
+
+def _hash_file(file_path: str, block_size: int = 16 * 1024 * 1024) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def schema_version() -> str:
+    # any change to the types or the definitions may change what gets parsed, collections add the bounds and tiles
+    digest = hashlib.blake2b(digest_size=16)
+    for module in ('types.py', 'definitions.py', 'collection.py', 'spatial.py'):
+        with open(os.path.join(os.path.dirname(types.__file__), module), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ParseCache:
+    def __init__(self, folder: str, sources: typing.List[str], *, path_format: str = 'points'):
+        self._folder = folder
+        self._manifest_path = os.path.join(folder, 'manifest.json')
+        self._sources = sources
+        self._key = {'schema': schema_version(), 'path_format': path_format}
+        self._manifest = self._read_manifest()
+
+    def _read_manifest(self) -> dict:
+        empty = dict(self._key, files={}, collections=[])
+        if not os.path.exists(self._manifest_path):
+            return empty
+        with open(self._manifest_path) as f:
+            manifest = json.load(f)
+        if any(manifest.get(key) != value for key, value in self._key.items()):
+            return empty
+        files = {}
+        for file_path in self._sources:
+            name = os.path.basename(file_path)
+            stored = manifest['files'].get(name)
+            current = self._stat(file_path)
+            if stored is None:
+                return empty
+            if stored['size'] != current['size']:
+                return empty
+            if stored['mtime'] != current['mtime']:
+                # copied or touched files keep their cache as long as their content did not change
+                current['hash'] = _hash_file(file_path)
+                if current['hash'] != stored['hash']:
+                    return empty
+            else:
+                current['hash'] = stored['hash']
+            files[name] = current
+        manifest['files'] = files
+        return manifest
+
+    @staticmethod
+    def _stat(file_path: str) -> dict:
+        stat = os.stat(file_path)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    def __contains__(self, name: str):
+        return name in self._manifest['collections']
+
+    def load(self, name: str) -> typing.Iterator[dict]:
+        with open(self._collection_path(name), 'rb') as f:
+            yield from bson.decode_file_iter(f)
+
+    def save(self, name: str, entities: typing.Iterable[dict]):
+        os.makedirs(self._folder, exist_ok=True)
+        with open(self._collection_path(name), 'wb') as f:
+            for entity in entities:
+                f.write(bson.encode(entity))
+        if name not in self._manifest['collections']:
+            self._manifest['collections'].append(name)
+
+    def commit(self):
+        for file_path in self._sources:
+            name = os.path.basename(file_path)
+            if name not in self._manifest['files']:
+                self._manifest['files'][name] = dict(self._stat(file_path), hash=_hash_file(file_path))
+        os.makedirs(self._folder, exist_ok=True)
+        with open(self._manifest_path, 'w') as f:
+            json.dump(self._manifest, f, indent=2)
+
+    def _collection_path(self, name: str):
+        return os.path.join(self._folder, f'{name}.bson')
@@ -1,29 +1,218 @@
-from xml.etree.ElementTree import Element
+import asyncio
+import hashlib
+import json
+import typing
 
-from legends_explorer.legends import LegendsConnection
+from pymongo import ASCENDING, IndexModel, InsertOne, ReplaceOne, DeleteMany
+
+from legends_explorer.legends import LegendsConnection, BatchWriter, ParquetSink
+from legends_explorer.legends import spatial
+from legends_explorer.legends.profiler import profiler
 from legends_explorer.legends.types import Entity
+from legends_explorer.legends.vocabulary import Vocabulary
+
+
+def content_hash(entity: dict) -> str:
+    data = json.dumps(entity, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+IndexSpec = typing.Union[str, typing.Tuple[str, ...]]
 
 
 class Collection:
-    def __init__(self, name: str, root: Entity):
+    def __init__(self, name: str, root: Entity, *, indexes: typing.List[IndexSpec] = None,
+                 geometry: typing.List[str] = None):
         self._name = name
+        self._indexes = list(indexes or [])
+        self._geometry = list(geometry or [])
         self._entities = {}
+        self._overrides = {}
+        self._complete = [False, False]
         self._root = root
+        self._writer: typing.Optional[typing.Union[BatchWriter, ParquetSink]] = None
+        self._compact = False
+        self._path_format = 'points'
+        self._dumped = False
+        self._vocabulary: typing.Optional[Vocabulary] = None
+        self._observers: typing.List[typing.Callable[[dict], None]] = []
 
-    async def parse(self, elem: Element):
-        for child in elem:  # type: Element
-            entity = self._root.parse(child)
-            merge_key = entity[self._root.merge_id]
-            if merge_key in self._entities:
-                entity = self._merge(self._entities[merge_key], entity)
+    def add(self, entity: dict, *, final: bool = False):
+        for observer in self._observers:
+            observer(entity)
+        merge_key = entity[self._root.merge_id]
+        if merge_key in self._entities:
+            profiler.count(self._name, 'merged')
+            with profiler.timer(self._name, 'merge'):
+                entity = self._merge(self._root.unpack(self._entities[merge_key]), entity)
+        if final and self._writer is not None:
+            self._entities.pop(merge_key, None)
+            self._writer.write(self._name, self._encode(self._dump(entity)))
+        elif self._compact:
+            self._entities[merge_key] = self._root.pack(entity)
+        else:
             self._entities[merge_key] = entity
 
+    def join(self, entity: dict, *, override: bool, final: bool = False):
+        merge_key = entity[self._root.merge_id]
+        if not override:
+            self.add(entity, final=final and self._complete[True] and merge_key not in self._overrides)
+            if merge_key in self._overrides:
+                self.add(self._overrides.pop(merge_key), final=final)
+        elif self._complete[False] or merge_key in self._entities:
+            self.add(entity, final=final)
+        else:
+            self._overrides[merge_key] = entity
+
+    def complete(self, *, override: bool, final: bool = False):
+        self._complete[override] = True
+        if not override:
+            for entity in self._overrides.values():
+                self.add(entity, final=final)
+            self._overrides = {}
+        elif final:
+            self.flush()
+
+    @property
+    def root(self):
+        return self._root
+
+    def fresh(self) -> 'Collection':
+        return Collection(self._name, self._root, indexes=self._indexes, geometry=self._geometry)
+
+    @property
+    def geometry(self):
+        return self._geometry
+
+    @property
+    def indexes(self) -> typing.List[IndexModel]:
+        models = []
+        indexes = [self._root.merge_id] + self._indexes
+        if self._geometry:
+            indexes.append('tiles')
+        for index in indexes:
+            fields = (index,) if isinstance(index, str) else index
+            models.append(IndexModel([(field, ASCENDING) for field in fields]))
+        return models
+
     def _merge(self, origin, override):
         return self._root.merge(origin, override)
 
-    async def insert(self, mongo: LegendsConnection):
-        regions = [r for r in self._entities.values()]
-        mongo.db[self._name].insert(regions)
+    def sort(self, key: typing.Callable[[dict], typing.Any], *, rank: str = None):
+        unpack = self._root.unpack
+        items = sorted(self._entities.items(), key=lambda item: key(unpack(item[1])))
+        entities = {}
+        for order, (merge_key, entity) in enumerate(items):
+            if rank is not None:
+                entity = unpack(entity)
+                entity[rank] = order
+                if self._compact and not self._dumped:
+                    entity = self._root.pack(entity)
+            entities[merge_key] = entity
+        self._entities = entities
+
+    def observe(self, observer: typing.Callable[[dict], None]):
+        self._observers.append(observer)
+
+    def stream_to(self, writer: typing.Union[BatchWriter, ParquetSink]):
+        self._writer = writer
+
+    def configure(self, *, compact: bool = False, path_format: str = 'points', vocabulary: Vocabulary = None):
+        self._compact = compact
+        self._path_format = path_format
+        self._vocabulary = vocabulary if self._root.translates else None
+
+    def load(self, entities: typing.Iterable[dict]):
+        merge_id = self._root.merge_id
+        self._entities = {}
+        for entity in entities:
+            for observer in self._observers:
+                observer(entity)
+            self._entities[entity[merge_id]] = entity
+        self._dumped = True
+
+    def entities(self) -> typing.Iterator[dict]:
+        if self._dumped:
+            return iter(self._entities.values())
+        return (self._dump(entity) for entity in self._entities.values())
+
+    def _dump(self, entity) -> dict:
+        if not self._geometry:
+            return self._root.dump(entity, self._path_format)
+        entity = self._root.unpack(entity)
+        document = self._root.dump(entity, self._path_format)
+        # bounds are read from the parsed values, before paths take the requested storage format
+        boxes = [spatial.bounds(self._root[field], entity[field]) for field in self._geometry if field in entity]
+        box = spatial.union(box for box in boxes if box is not None)
+        if box is None:
+            return document
+        return dict(document, **spatial.geometry(box))
+
+    def _encode(self, document: dict) -> dict:
+        # categories are only stored as codes in the database, entities() still gives their values
+        if self._vocabulary is None:
+            return document
+        return self._root.translate(document, self._vocabulary.encode)
+
+    def flush(self):
+        if self._writer is None:
+            return
+        for entity in self.entities():
+            self._writer.write(self._name, self._encode(entity))
+        self._entities = {}
+        self._writer.flush(self._name)
+
+    async def insert(self, mongo: LegendsConnection, *, batch_size: int = 1000):
+        regions = [self._encode(r) for r in self.entities()]
+        collection = mongo.collection(self._name)
+        with profiler.timer(self._name, 'insert'):
+            await asyncio.gather(*(collection.insert_many(regions[start:start + batch_size])
+                                   for start in range(0, len(regions), batch_size)))
+        profiler.count(self._name, 'inserted', len(regions))
+
+    async def create_indexes(self, mongo: LegendsConnection, *, rebuild: bool = False):
+        collection = mongo.collection(self._name)
+        with profiler.timer(self._name, 'index'):
+            if rebuild:
+                await collection.drop_indexes()
+            await collection.create_indexes(self.indexes)
+
+    async def sync(self, mongo: LegendsConnection, region: str, *, batch_size: int = 1000) -> typing.Dict[str, int]:
+        merge_id = self._root.merge_id
+        collection = mongo.collection(self._name)
+        await collection.create_index([('_region', 1), (merge_id, 1)])
+        stored = {}
+        # documents inserted before incremental imports have no region yet, they get replaced once
+        query = {'$or': [{'_region': region}, {'_region': {'$exists': False}}]}
+        for document in await collection.find(query, {merge_id: 1, '_hash': 1}):
+            stored[document.get(merge_id)] = document['_id'], document.get('_hash')
+        counts = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+        batches = [[]]
+        for entity in map(self._encode, self.entities()):
+            entity_hash = content_hash(entity)
+            document = dict(entity, _region=region, _hash=entity_hash)
+            merge_key = entity[merge_id]
+            if merge_key not in stored:
+                batches[-1].append(InsertOne(document))
+                counts['inserted'] += 1
+            else:
+                _id, stored_hash = stored.pop(merge_key)
+                if stored_hash == entity_hash:
+                    counts['unchanged'] += 1
+                    continue
+                batches[-1].append(ReplaceOne({'_id': _id}, document))
+                counts['updated'] += 1
+            if len(batches[-1]) >= batch_size:
+                batches.append([])
+        deleted = [_id for _id, _ in stored.values()]
+        for start in range(0, len(deleted), batch_size):
+            batches.append([DeleteMany({'_id': {'$in': deleted[start:start + batch_size]}})])
+        counts['deleted'] = len(deleted)
+        with profiler.timer(self._name, 'sync'):
+            await asyncio.gather(*(collection.bulk_write(batch) for batch in batches if batch))
+        for counter, value in counts.items():
+            profiler.count(self._name, counter, value)
+        return counts
 
     def __len__(self):
         return len(self._entities)
@@ -1,63 +1,72 @@
 from legends_explorer.legends import Collection
 from legends_explorer.legends.types import (
-    Int, Str, Rectangle, Coordinates, List, GroupBy, Bool, SplitStr,
+    Int, Str, Category, Rectangle, Coordinates, List, GroupBy, Bool, SplitStr,
     LinkToPreviousGroupBy, Entity, Population, Path, GroupTree, Wrap
 )
 
 definitions = {
     'regions': Collection('regions', Entity('id', {
-        'id': Int(), 'name': Str(), 'type': Str(), 'coords': Path(), 'evilness': Str(), 'force_id': Int()
-    })),
+        'id': Int(), 'name': Str(), 'type': Category('region_type'), 'coords': Path(), 'evilness': Str(),
+        'force_id': Int()
+    }), geometry=['coords']),
     'underground_regions': Collection('underground_regions', Entity('id', {
-        'id': Int(), 'type': Str(), 'depth': Int(), 'coords': Path()
-    })),
+        'id': Int(), 'type': Category('underground_region_type'), 'depth': Int(), 'coords': Path()
+    }), geometry=['coords']),
     'landmasses': Collection('landmasses', Entity('id', {
         'id': Int(), 'name': Str(), 'coord_1': Coordinates(), 'coord_2': Coordinates()
-    })),
+    }), geometry=['coord_1', 'coord_2']),
     'mountain_peaks': Collection('mountain_peaks', Entity('id', {
         'id': Int(), 'name': Str(), 'coords': Coordinates(), 'height': Int(), 'is_volcano': Bool()
-    })),
+    }), geometry=['coords']),
     'rivers': Collection('rivers', Entity('name', {
         'name': Str(), 'path': Path(points=5), 'end_pos': Coordinates()
-    })),
+    }), geometry=['path', 'end_pos']),
     'sites': Collection('sites', Entity('id', {
-        'id': Int(), 'type': Str(), 'name': Str(), 'coords': Coordinates(), 'rectangle': Rectangle(),
+        'id': Int(), 'type': Category('site_type'), 'name': Str(), 'coords': Coordinates(), 'rectangle': Rectangle(),
         'civ_id': Int(), 'cur_owner_id': Int(),
         'structures': List(Entity('id', {
-            'id': Int(), 'type': Str(), 'name': Str(), 'name2': Str(), 'entity_id': Int(), 'deity': Int(),
+            'id': Int(), 'type': Category('structure_type'), 'name': Str(), 'name2': Str(), 'entity_id': Int(),
+            'deity': Int(),
             'subtype': Str(), 'owner_hfid': Int(), 'worship_hfid': Int(), 'deity_type': Int(),
             'inhabitant': GroupBy('inhabitants', Int()), 'religion': Int(), 'dungeon_type': Int(),
             'copied_artifact_id': GroupBy('copied_artifact_ids', Int())
         }, transforms={'local_id': 'id'})),
         'site_properties': List(Entity('id', {
-            'id': Int(), 'structure_id': Int(), 'type': Str(), 'owner_hfid': Int()
+            'id': Int(), 'structure_id': Int(), 'type': Category('site_property_type'), 'owner_hfid': Int()
         }))
-    })),
+    }), indexes=[
+        'civ_id', 'cur_owner_id', 'structures.entity_id', 'structures.owner_hfid', 'site_properties.owner_hfid'
+    ], geometry=['coords']),
     'world_constructions': Collection('world_constructions', Entity('id', {
-        'id': Int(), 'name': Str(), 'type': Str(), 'coords': Path()
-    })),
+        'id': Int(), 'name': Str(), 'type': Category('world_construction_type'), 'coords': Path()
+    }), geometry=['coords']),
     'artifacts': Collection('artifacts', Entity('id', {
-        'id': Int(), 'name': Str(), 'site_id': Int(), 'holder_hfid': Int(), 'mat': Str(), 'item_type': Str(),
+        'id': Int(), 'name': Str(), 'site_id': Int(), 'holder_hfid': Int(), 'mat': Category('mat'),
+        'item_type': Category('item_type'),
         'structure_local_id': Int(), 'subregion_id': Int(), 'item_description': Str(), 'page_count': Int(),
         'abs_tile_x': Str(), 'abs_tile_y': Str(), 'abs_tile_z': Str(), 'writing': Int(), 'item_subtype': Str(),
         'item': Entity('name_string', {
             'name_string': Str(), 'page_number': Int(), 'page_written_content_id': Int(),
             'writing_written_content_id': Int()
         })
-    })),
+    }), indexes=['site_id', 'holder_hfid']),
     "historical_figures": Collection('historical_figures', Entity('id', {
-        'id': Int(), 'name': Str(), 'race': Str(), 'caste': Str(), 'appeared': Int(), 'sex': Int(),
+        'id': Int(), 'name': Str(), 'race': Category('race'), 'caste': Category('caste'), 'appeared': Int(),
+        'sex': Int(),
         'birth_year': Int(), 'birth_seconds72': Int(), 'death_year': Int(), 'death_seconds72': Int(),
-        'associated_type': Str(), 'goal': GroupBy('goals', Str()), 'ent_pop_id': Int(), 'animated': Bool(),
+        'associated_type': Category('associated_type'), 'goal': GroupBy('goals', Category('goal')),
+        'ent_pop_id': Int(), 'animated': Bool(),
         'current_identity_id': Int(), 'deity': Bool(), 'force': Bool(), 'animated_string': Str(),
-        'sphere': GroupBy('spheres', Str()), 'interaction_knowledge': GroupBy('spheres', Str()),
+        'sphere': GroupBy('spheres', Category('sphere')),
+        'interaction_knowledge': GroupBy('spheres', Category('sphere')),
         'journey_pet': GroupBy('journey_pets', Str()), 'holds_artifact': GroupBy('holds_artifacts', Int()),
         'active_interaction': GroupBy('active_interactions', Str()),
         'site_link': GroupBy('site_links', Entity('site_id', {
-            'link_type': Str(), 'site_id': Int(), 'sub_id': Int(), 'entity_id': Int(), 'occupation_id': Int()
+            'link_type': Category('link_type'), 'site_id': Int(), 'sub_id': Int(), 'entity_id': Int(),
+            'occupation_id': Int()
         })),
         'hf_link': GroupBy('hf_links', Entity('hfid', {
-            'link_type': Str(), 'hfid': Int(), 'link_strength': Int()
+            'link_type': Category('link_type'), 'hfid': Int(), 'link_strength': Int()
         })),
         'vague_relationship': GroupBy('vague_relationships', Entity('hfid', {
             'childhood_friend': Bool(), 'hfid': Int(), 'war_buddy': Bool(), 'athlete_buddy': Bool(),
@@ -66,7 +75,7 @@ definitions = {
             'atheletic_rival': Bool(), 'business_rival': Bool(), 'jealous_relationship_grudge': Bool()
         })),
         'entity_link': GroupBy('entity_links', Entity('entity_id', {
-            'link_type': Str(), 'entity_id': Int(), 'link_strength': Int()
+            'link_type': Category('link_type'), 'entity_id': Int(), 'link_strength': Int()
         })),
         'entity_position_link': LinkToPreviousGroupBy(
             'entity_links', 'entity_position_link', Entity('entity_id', {
@@ -118,12 +127,16 @@ definitions = {
         'site_property': GroupBy('site_properties', Entity('site_id', {
             'site_id': Int(), 'property_id': Int()
         }))
-    })),
+    }), indexes=[
+        'race', 'current_identity_id', 'hf_links.hfid', 'entity_links.entity_id', 'site_links.site_id',
+        'holds_artifacts'
+    ]),
     'entity_populations': Collection('entity_populations', Entity('id', {
         'id': Int(), 'race': Population(), 'civ_id': Int()
-    })),
+    }), indexes=['civ_id']),
     'entities': Collection('entities', Entity('id', {
-        'id': Int(), 'name': Str(), 'race': Str(), 'type': Str(), 'worship_id': Int(), 'profession': Str(),
+        'id': Int(), 'name': Str(), 'race': Category('race'), 'type': Category('entity_type'), 'worship_id': Int(),
+        'profession': Str(),
         'histfig_id': GroupBy('histfig_ids', Int()), 'weapon': GroupBy('weapons', Str()),
         'child': GroupBy('children', Int()), 'claims': Path(),
         'honor': GroupBy('honors', Entity('id', {
@@ -152,7 +165,7 @@ definitions = {
                 }))
             }))
         }))
-    })),
+    }), indexes=['histfig_ids', 'entity_position_assignments.histfig', 'entity_links.target']),
     'creature_raw': Collection('creature_raw', Entity('creature_id', {
         'creature_id': Str(), 'name_singular': Str(), 'name_plural': Str(), 'mundane': Bool(), 'mates_to_breed': Bool(),
         'vermin_': GroupTree('vermin_', 1, Bool()), 'two_genders': Bool(), 'has_male': Bool(), 'has_female': Bool(),
@@ -163,16 +176,18 @@ definitions = {
     })),
     'identities': Collection('identities', Entity('id', {
         'id': Int(), 'name': Str(), 'histfig_id': Int(), 'birth_year': Int(), 'birth_second': Int(), 'entity_id': Int(),
-        'profession': Str(), 'caste': Str(), 'race': Str(), 'nemesis_id': Int()
-    })),
+        'profession': Str(), 'caste': Category('caste'), 'race': Category('race'), 'nemesis_id': Int()
+    }), indexes=['histfig_id', 'entity_id']),
     'historical_events': Collection('historical_events', Entity('id', {
-        'id': Int(), 'year': Int(), 'seconds72': Int(), 'type': Str(), 'hfid': GroupBy('hfids', Int()), 'state': Str(),
+        'id': Int(), 'year': Int(), 'seconds72': Int(), 'type': Category('event_type'), 'hfid': GroupBy('hfids', Int()),
+        'state': Str(),
         'subregion_id': Int(), 'feature_layer_id': Int(), 'coords': Coordinates(), 'position_id': Int(), 'link': Str(),
         'civ_id': Int(), 'artifact_id': Int(), 'dest_entity_id': Int(), 'source_site_id': Int(), 'unit_id': Int(),
         'source_structure_id': Int(), 'source_entity_id': Int(), 'from_original': Bool(), 'identity_id': Int(),
         'trickster_hfid': Int(), 'hist_figure_id': Int(), 'reason': Str(), 'reason_id': Int(), 'slayer_hfid': Int(),
-        'slayer_item_id': Int(), 'slayer_shooter_item_id': Int(), 'cause': Str(), 'slayer_race': Str(), 'action': Str(),
-        'slayer_caste': Str(), 'agreement_id': Int(), 'successful': Bool(), 'failed_judgment_test': Bool(),
+        'slayer_item_id': Int(), 'slayer_shooter_item_id': Int(), 'cause': Str(), 'slayer_race': Category('race'),
+        'action': Str(), 'slayer_caste': Category('caste'), 'agreement_id': Int(), 'successful': Bool(),
+        'failed_judgment_test': Bool(),
         'method': Str(), 'top_facet': Str(), 'top_facet_rating': Int(), 'top_facet_modifier': Int(), 'site_id': Int(),
         'ally_defense_bonus': Int(), 'top_value': Str(), 'top_value_rating': Int(), 'top_value_modifier': Int(),
         'student_hfid': Int(), 'teacher_hfid': Int(), 'interaction': Str(), 'hfid_target': Int(), 'wc_id': Int(),
@@ -210,8 +225,9 @@ definitions = {
         'expelled_pop_id': LinkToPreviousGroupBy('expelled_creatures', 'pop_id', Int()), 'join_entity_id': Int(),
         'expelled_number': LinkToPreviousGroupBy('expelled_creatures', 'number', Int()), 'changer_hfid': Int(),
         'dispute': Str(), 'entity_id_1': Int(), 'entity_id_2': Int(), 'site_id_1': Int(), 'site_id_2': Int(),
-        'pop_': GroupTree('pop_', 1, Int()), 'old_race': Str(), 'old_caste': Str(), 'new_race': Str(),
-        'new_caste': Str(), 'top_relationship_factor': Str(), 'corrupt_convicter_hfid': Int(), 'plotter_hfid': Int(),
+        'pop_': GroupTree('pop_', 1, Int()), 'old_race': Category('race'),
+        'old_caste': Category('caste'), 'new_race': Category('race'), 'new_caste': Category('caste'),
+        'top_relationship_factor': Str(), 'corrupt_convicter_hfid': Int(), 'plotter_hfid': Int(),
         'initiating_enid': Int(), 'joining_enid': GroupBy('joining_enids', Int()), 'arresting_enid': Int(),
         'wanted_and_recognized': Bool(), 'held_firm_in_interrogation': Bool(), 'lure_hfid': Int(),
         'coconspirator_bonus': Int(), 'site_entity_id': Int(), 'civ_entity_id': Int(), 'new_site_civ_id': Int(),
@@ -224,19 +240,27 @@ definitions = {
         'modifier_hfid': Int(), 'modification': Str(), 'a_support_merc_enid': Int(), 'rebuilt': Bool(),
         'law_add': Str(), 'law_remove': Str(), 'disturbance': Bool(), 'surveiled_target': Bool(), 'position': Str(),
         'site_property_id': Int(), 'destroyer_enid': Int(), 'saboteur_hfid': Int(), 'site': Int(), 'structure': Int(),
-        'histfig': Int(), 'civ': Int(), 'link_type': Str(), 'new_job': Str(), 'old_job': Str(), 'appointer_hfid': Int(),
+        'histfig': Int(), 'civ': Int(), 'link_type': Category('link_type'), 'new_job': Str(), 'old_job': Str(),
+        'appointer_hfid': Int(),
         'promise_to_hfid': Int(), 'trickster': Int(), 'identity_histfig_id': Int(), 'identity_name': Str(),
-        'target': Int(), 'slayer_hf': Int(), 'death_cause': Str(), 'victim_hf': Int(), 'item_type': Str(), 'mat': Str(),
+        'target': Int(), 'slayer_hf': Int(), 'death_cause': Str(), 'victim_hf': Int(),
+        'item_type': Category('item_type'),
+        'mat': Category('mat'),
         'entity': Int(), 'item': Int(), 'stash_site': Int(), 'theft_method': Str(), 'item_subtype': Str(),
-        'creator_unit_id': Int(), 'hf': Int(), 'hf_target': Int(), 'victim': Int(), 'race': Str(), 'caste': Str(),
+        'creator_unit_id': Int(), 'hf': Int(), 'hf_target': Int(), 'victim': Int(), 'race': Category('race'),
+        'caste': Category('caste'),
         'part_lost': Bool(), 'eater': Int(), 'wounder': Int(), 'woundee': Int(), 'woundee_race': Int(),
         'woundee_caste': Int(), 'body_part': Int(), 'injury_type': Str(), 'site_civ': Int(), 'builder_hf': Int(),
         'rebuild': Bool(), 'changee': Int(), 'changer': Int(), 'pets': Str(), 'group': Int(),
-        'identity_nemesis_id': Int(), 'identity_race': Str(), 'identity_caste': Str(), 'mattype': Int(),
+        'identity_nemesis_id': Int(), 'identity_race': Category('race'),
+        'identity_caste': Category('caste'), 'mattype': Int(),
         'victim_entity': Int(), 'abuse_type': Str(), 'pile_type': Str(), 'bodies': GroupBy('bodies_list', Int()),
         'source': Int(), 'destination': Int(), 'matindex': Int(), 'student': Int(), 'teacher': Int(),
         'artifact': Int(), 'secret_text': Str(), 'tree': Int(), 'item_mat': Str(), 'interaction_action': Str(),
         'doer': Int(), 'sanctify_hf': Int(), 'region': Int(),
         'circumstance': Entity('type', {'type': Str(), 'hist_event_collection': Int()})
-    }))
+    }), indexes=[
+        ('year', 'seconds72'), 'order', ('type', 'order'), 'hfids', 'hist_figure_id', 'site_id', 'civ_id',
+        'entity_id', 'artifact_id', 'slayer_hfid'
+    ])
 }
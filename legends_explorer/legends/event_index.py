@@ -0,0 +1,41 @@
+import typing
+from array import array
+
+from legends_explorer.legends.references import references
+
+
+class EventIndex:
+    def __init__(self):
+        self._postings: typing.Dict[typing.Tuple[str, int], array] = {}
+        self._sorted = True
+
+    def add(self, event: dict):
+        event_id = event['id']
+        for ref in references(event):
+            if ref not in self._postings:
+                self._postings[ref] = array('i')
+            self._postings[ref].append(event_id)
+        self._sorted = False
+
+    def _sort(self):
+        if self._sorted:
+            return
+        # legends and legends_plus records of an event can both mention the same figure
+        for ref, events in self._postings.items():
+            self._postings[ref] = array('i', sorted(set(events)))
+        self._sorted = True
+
+    def events(self, kind: str, ref: int) -> typing.List[int]:
+        self._sort()
+        return self._postings.get((kind, ref), array('i')).tolist()
+
+    def documents(self, bucket_size: int = 1000) -> typing.Iterator[dict]:
+        self._sort()
+        for (kind, ref), events in self._postings.items():
+            for start in range(0, len(events), bucket_size):
+                bucket = events[start:start + bucket_size]
+                yield {'kind': kind, 'ref': ref, 'first': bucket[0], 'last': bucket[-1], 'count': len(bucket),
+                       'events': bucket.tolist()}
+
+    def __len__(self):
+        return len(self._postings)
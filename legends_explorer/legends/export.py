@@ -0,0 +1,157 @@
+import json
+import os
+import shutil
+import typing
+
+from legends_explorer.legends.profiler import profiler
+from legends_explorer.legends.types import ParsingType, Entity, Bool, Int, Float, Str, Category, SplitStr, \
+    Population, Coordinates, Path, Rectangle, List, GroupBy, LinkToPreviousGroupBy, Wrap, GroupTree
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+export_formats = ['parquet']
+
+
+def arrow_type(p_type: ParsingType, path_format: str = 'points'):
+    if isinstance(p_type, Bool):
+        return pyarrow.bool_()
+    if isinstance(p_type, Int):
+        return pyarrow.int32()
+    if isinstance(p_type, Float):
+        return pyarrow.float64()
+    if isinstance(p_type, Category):
+        return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    if isinstance(p_type, Str):
+        return pyarrow.string()
+    if isinstance(p_type, SplitStr):
+        return pyarrow.list_(pyarrow.string())
+    if isinstance(p_type, Population):
+        return pyarrow.struct([('race', pyarrow.string()), ('population', pyarrow.int32())])
+    if isinstance(p_type, Coordinates):
+        return pyarrow.struct([('x', pyarrow.int32()), ('y', pyarrow.int32())])
+    if isinstance(p_type, Rectangle):
+        return pyarrow.struct([(key, pyarrow.int32()) for key in ('x0y0', 'x0y1', 'x1y0', 'x1y1')])
+    if isinstance(p_type, Path):
+        if path_format == 'packed':
+            return pyarrow.list_(pyarrow.int32())
+        return pyarrow.list_(pyarrow.struct([(key, pyarrow.int32()) for key in p_type.keys]))
+    if isinstance(p_type, Wrap):
+        return pyarrow.struct([(p_type.key, arrow_type(p_type.elem, path_format))])
+    if isinstance(p_type, List):
+        return pyarrow.list_(arrow_type(p_type.elem, path_format))
+    if isinstance(p_type, GroupBy):
+        elem = arrow_type(p_type.elem, path_format)
+        if p_type.links:
+            links = [(key, arrow_type(link.elem, path_format)) for key, link in p_type.links.items()]
+            if isinstance(elem, pyarrow.StructType):
+                elem = pyarrow.struct(list(elem) + links)
+            else:
+                elem = pyarrow.struct(links)
+        return pyarrow.list_(elem)
+    if isinstance(p_type, GroupTree):
+        # tree keys come from the tags of the dump, stored as a JSON object
+        return pyarrow.string()
+    if isinstance(p_type, Entity):
+        return pyarrow.struct(list(arrow_schema(p_type, path_format)))
+    raise ValueError(f'No Arrow type for {type(p_type).__name__}')
+
+
+def arrow_schema(entity: Entity, path_format: str = 'points'):
+    fields = {}
+    for key, p_type in entity:
+        if isinstance(p_type, LinkToPreviousGroupBy):
+            continue
+        if isinstance(p_type, GroupBy):
+            key = p_type.group_key
+        if key not in fields:
+            fields[key] = arrow_type(p_type, path_format)
+    for group in entity.group_trees:
+        fields.setdefault(group.group_key, arrow_type(group, path_format))
+    return pyarrow.schema(list(fields.items()))
+
+
+class ParquetSink:
+    def __init__(self, folder: str, region: str, entities: typing.Dict[str, Entity], *, path_format: str = 'points',
+                 row_group_size: int = 10000, rows_per_file: int = 1000000):
+        self._folder = folder
+        self._region = region
+        self._entities = entities
+        self._path_format = path_format
+        self._row_group_size = row_group_size
+        self._rows_per_file = rows_per_file
+        self._rows: typing.Dict[str, typing.List[dict]] = {}
+        self._schemas: typing.Dict[str, 'pyarrow.Schema'] = {}
+        self._trees: typing.Dict[str, typing.List[str]] = {}
+        self._writers: typing.Dict[str, 'pyarrow.parquet.ParquetWriter'] = {}
+        self._files: typing.Dict[str, int] = {}
+        self._file_rows: typing.Dict[str, int] = {}
+        self._counts: typing.Dict[str, int] = {}
+
+    def write(self, name: str, entity: dict):
+        if name not in self._rows:
+            self._rows[name] = []
+        rows = self._rows[name]
+        rows.append(entity)
+        if len(rows) >= self._row_group_size:
+            self._submit(name)
+
+    def flush(self, name: str):
+        if name in self._rows:
+            self._submit(name)
+
+    def close(self):
+        for name in list(self._rows):
+            self._submit(name)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+    def count(self, name: str):
+        return self._counts.get(name, 0)
+
+    def files(self, name: str) -> typing.List[str]:
+        return [self._file_path(name, index) for index in range(self._files.get(name, 0))]
+
+    def _submit(self, name: str):
+        rows = self._rows.pop(name)
+        if not rows:
+            return
+        with profiler.timer(name, 'export'):
+            schema = self._schema(name)
+            trees = self._trees[name]
+            if trees:
+                rows = [dict(row, **{key: json.dumps(row[key]) for key in trees if key in row}) for row in rows]
+            batch = pyarrow.RecordBatch.from_pylist(rows, schema=schema)
+            self._writer(name).write_batch(batch)
+        self._file_rows[name] += len(rows)
+        self._counts[name] = self._counts.get(name, 0) + len(rows)
+        profiler.count(name, 'exported', len(rows))
+        if self._file_rows[name] >= self._rows_per_file:
+            self._writers.pop(name).close()
+
+    def _schema(self, name: str):
+        if name not in self._schemas:
+            entity = self._entities[name]
+            self._schemas[name] = arrow_schema(entity, self._path_format)
+            self._trees[name] = [group.group_key for group in entity.group_trees]
+        return self._schemas[name]
+
+    def _file_path(self, name: str, index: int):
+        return os.path.join(self._folder, name, f'world={self._region}', f'part-{index:05}.parquet')
+
+    def _writer(self, name: str):
+        if name not in self._writers:
+            index = self._files.get(name, 0)
+            file_path = self._file_path(name, index)
+            if index == 0:
+                # parts of a previous export of this region would be read along with the new ones
+                shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            self._writers[name] = pyarrow.parquet.ParquetWriter(file_path, self._schemas[name])
+            self._files[name] = index + 1
+            self._file_rows[name] = 0
+        return self._writers[name]
@@ -0,0 +1,221 @@
+import collections
+import hashlib
+import sys
+import typing
+from array import array
+
+node_kinds = ['hf', 'entity', 'site']
+family_links = ('mother', 'father', 'child', 'spouse', 'former spouse', 'deceased spouse')
+
+# fields of historical figures linking them to another node, with the field holding the other node's id
+_links = {
+    'hf_links': ('hf', 'hfid'),
+    'vague_relationships': ('hf', 'hfid'),
+    'entity_links': ('entity', 'entity_id'),
+    'site_links': ('site', 'site_id')
+}
+
+_arrays = {
+    'kinds': 'B', 'ids': 'i', 'out_offsets': 'i', 'out_targets': 'i', 'out_types': 'H', 'in_offsets': 'i',
+    'in_targets': 'i', 'in_types': 'H'
+}
+
+
+def _link_type(field: str, link: dict) -> typing.Optional[str]:
+    if field != 'vague_relationships':
+        return link.get('link_type')
+    # vague relationships are a set of flags, the one set names the relationship
+    return next((key for key, value in link.items() if key != 'hfid' and value is True), None)
+
+
+def _csr(size: int, sources: typing.List[int], targets: typing.List[int], types: typing.List[int]):
+    offsets = array('i', bytes(4 * (size + 1)))
+    for source in sources:
+        offsets[source + 1] += 1
+    for index in range(size):
+        offsets[index + 1] += offsets[index]
+    positions = offsets[:-1]
+    csr_targets = array('i', bytes(4 * len(sources)))
+    csr_types = array('H', bytes(2 * len(sources)))
+    for source, target, link_type in zip(sources, targets, types):
+        csr_targets[positions[source]] = target
+        csr_types[positions[source]] = link_type
+        positions[source] += 1
+    return offsets, csr_targets, csr_types
+
+
+class RelationshipGraph:
+    def __init__(self, types: typing.List[str], arrays: typing.Dict[str, array]):
+        self._types = types
+        self._type_codes = {link_type: code for code, link_type in enumerate(types)}
+        self._arrays = arrays
+        self._nodes = {(node_kinds[kind], ref): index
+                       for index, (kind, ref) in enumerate(zip(arrays['kinds'], arrays['ids']))}
+
+    @classmethod
+    def build(cls, figures: typing.Iterable[dict]) -> 'RelationshipGraph':
+        nodes: typing.Dict[typing.Tuple[int, int], int] = {}
+        types: typing.Dict[str, int] = {}
+        edges = set()
+
+        def node(kind: int, ref: int):
+            if (kind, ref) not in nodes:
+                nodes[kind, ref] = len(nodes)
+            return nodes[kind, ref]
+
+        for figure in figures:
+            source = node(0, figure['id'])
+            for field, (kind, key) in _links.items():
+                for link in figure.get(field, ()):
+                    link_type = _link_type(field, link)
+                    if link.get(key) is None or link.get(key) < 0 or link_type is None:
+                        continue
+                    target = node(node_kinds.index(kind), link[key])
+                    edges.add((source, target, types.setdefault(link_type, len(types))))
+        edges = sorted(edges)
+        sources, targets, codes = ([edge[index] for edge in edges] for index in range(3))
+        arrays = {'kinds': array('B', (kind for kind, _ in nodes)), 'ids': array('i', (ref for _, ref in nodes))}
+        arrays['out_offsets'], arrays['out_targets'], arrays['out_types'] = _csr(len(nodes), sources, targets, codes)
+        arrays['in_offsets'], arrays['in_targets'], arrays['in_types'] = _csr(len(nodes), targets, sources, codes)
+        return cls(sorted(types, key=types.get), arrays)
+
+    def digest(self) -> str:
+        digest = hashlib.blake2b(repr(self._types).encode(), digest_size=16)
+        for name in _arrays:
+            digest.update(self._arrays[name].tobytes())
+        return digest.hexdigest()
+
+    def documents(self, chunk_size: int = 4 * 1024 * 1024) -> typing.Iterator[dict]:
+        # the digest tells readers holding a loaded graph that it was imported again
+        yield {'name': 'meta', 'chunk': 0, 'types': self._types, 'byteorder': sys.byteorder,
+               'nodes': len(self._nodes), 'edges': len(self._arrays['out_targets']), 'digest': self.digest()}
+        for name in _arrays:
+            data = self._arrays[name].tobytes()
+            for chunk, start in enumerate(range(0, max(len(data), 1), chunk_size)):
+                yield {'name': name, 'chunk': chunk, 'data': data[start:start + chunk_size]}
+
+    @classmethod
+    def from_documents(cls, documents: typing.Iterable[dict]) -> typing.Optional['RelationshipGraph']:
+        meta = None
+        chunks: typing.Dict[str, typing.List[typing.Tuple[int, bytes]]] = {name: [] for name in _arrays}
+        for document in documents:
+            if document['name'] == 'meta':
+                meta = document
+            elif document['name'] in chunks:
+                chunks[document['name']].append((document['chunk'], bytes(document['data'])))
+        if meta is None:
+            return None
+        arrays = {}
+        for name, typecode in _arrays.items():
+            arrays[name] = array(typecode, b''.join(data for _, data in sorted(chunks[name])))
+            if meta['byteorder'] != sys.byteorder:
+                arrays[name].byteswap()
+        return cls(meta['types'], arrays)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def node(self, kind: str, ref: int) -> typing.Optional[int]:
+        return self._nodes.get((kind, ref))
+
+    def describe(self, index: int) -> typing.Tuple[str, int]:
+        return node_kinds[self._arrays['kinds'][index]], self._arrays['ids'][index]
+
+    def _codes(self, types: typing.Optional[typing.Iterable[str]]) -> typing.Optional[typing.Set[int]]:
+        if types is None:
+            return None
+        return {self._type_codes[link_type] for link_type in types if link_type in self._type_codes}
+
+    def edges(self, index: int, *, kinds: typing.Collection[str] = None,
+              codes: typing.Set[int] = None) -> typing.Iterator[typing.Tuple[int, int, int]]:
+        """
+        Yields (source, target, type code) for the links of a node in both directions
+        """
+        arrays = self._arrays
+        node_kinds_array = arrays['kinds']
+        allowed = None if kinds is None else {node_kinds.index(kind) for kind in kinds}
+        for direction in ('out', 'in'):
+            offsets, targets, types = arrays[f'{direction}_offsets'], arrays[f'{direction}_targets'], \
+                arrays[f'{direction}_types']
+            for position in range(offsets[index], offsets[index + 1]):
+                other = targets[position]
+                if allowed is not None and node_kinds_array[other] not in allowed:
+                    continue
+                if codes is not None and types[position] not in codes:
+                    continue
+                if direction == 'out':
+                    yield index, other, types[position]
+                else:
+                    yield other, index, types[position]
+
+    def _edge(self, edge: typing.Tuple[int, int, int]) -> dict:
+        source, target, code = edge
+        source_kind, source_id = self.describe(source)
+        target_kind, target_id = self.describe(target)
+        return {'source': {'kind': source_kind, 'id': source_id}, 'target': {'kind': target_kind, 'id': target_id},
+                'type': self._types[code]}
+
+    def neighborhood(self, start: int, hops: int, *, kinds: typing.Collection[str] = ('hf',),
+                     types: typing.Iterable[str] = None, limit: int = 1000) -> dict:
+        codes = self._codes(types)
+        distances = {start: 0}
+        edges = set()
+        frontier = [start]
+        for hop in range(1, hops + 1):
+            next_frontier = []
+            for index in frontier:
+                for edge in self.edges(index, kinds=kinds, codes=codes):
+                    other = edge[1] if edge[0] == index else edge[0]
+                    if other not in distances:
+                        if len(distances) >= limit:
+                            continue
+                        distances[other] = hop
+                        next_frontier.append(other)
+                    edges.add(edge)
+            frontier = next_frontier
+        return {
+            'nodes': [dict(zip(('kind', 'id'), self.describe(index)), distance=distance)
+                      for index, distance in distances.items()],
+            'edges': [self._edge(edge) for edge in sorted(edges)],
+            'truncated': len(distances) >= limit
+        }
+
+    def family(self, start: int, depth: int, *, limit: int = 1000) -> dict:
+        return self.neighborhood(start, depth, kinds=('hf',), types=family_links, limit=limit)
+
+    def path(self, source: int, target: int, *, kinds: typing.Collection[str] = ('hf',),
+             types: typing.Iterable[str] = None, max_depth: int = 6) -> typing.Optional[typing.List[dict]]:
+        if source == target:
+            return []
+        codes = self._codes(types)
+        # searched from both ends, each side only expands its smaller frontier
+        parents = ({source: None}, {target: None})
+        frontiers = ([source], [target])
+        for _ in range(max_depth):
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            next_frontier = []
+            for index in frontiers[side]:
+                for edge in self.edges(index, kinds=kinds, codes=codes):
+                    other = edge[1] if edge[0] == index else edge[0]
+                    if other in parents[side]:
+                        continue
+                    parents[side][other] = index, edge
+                    if other in parents[1 - side]:
+                        return self._join(parents, other)
+                    next_frontier.append(other)
+            if not next_frontier:
+                return None
+            frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+        return None
+
+    def _join(self, parents, meeting: int) -> typing.List[dict]:
+        steps = collections.deque()
+        index = meeting
+        while parents[0][index] is not None:
+            index, edge = parents[0][index]
+            steps.appendleft(edge)
+        index = meeting
+        while parents[1][index] is not None:
+            index, edge = parents[1][index]
+            steps.append(edge)
+        return [self._edge(edge) for edge in steps]
@@ -1,8 +1,78 @@
+import asyncio
+import copy
+import functools
+import re
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
 import pymongo
 
 
+_world_regex = re.compile(r'^[\w-]+$')
+
+
+class AsyncCollection:
+    def __init__(self, connection: 'LegendsConnection', name: str):
+        self._connection = connection
+        self._collection = connection.db[name]
+
+    async def find(self, filter: dict = None, projection: dict = None, *, sort: list = None, skip: int = 0,
+                   limit: int = 0) -> typing.List[dict]:
+        def find():
+            cursor = self._collection.find(filter, projection, skip=skip, limit=limit)
+            if sort is not None:
+                cursor = cursor.sort(sort)
+            return list(cursor)
+        return await self._connection.run(find)
+
+    async def find_one(self, filter: dict = None, projection: dict = None) -> typing.Optional[dict]:
+        return await self._connection.run(self._collection.find_one, filter, projection)
+
+    async def count_documents(self, filter: dict) -> int:
+        return await self._connection.run(self._collection.count_documents, filter)
+
+    async def aggregate(self, pipeline: typing.List[dict]) -> typing.List[dict]:
+        return await self._connection.run(lambda: list(self._collection.aggregate(pipeline)))
+
+    async def insert_many(self, documents: typing.List[dict], *, ordered: bool = False):
+        return await self._connection.run(self._collection.insert_many, documents, ordered=ordered)
+
+    async def bulk_write(self, requests: list, *, ordered: bool = False):
+        return await self._connection.run(self._collection.bulk_write, requests, ordered=ordered)
+
+    async def create_index(self, keys, **kwargs):
+        return await self._connection.run(self._collection.create_index, keys, **kwargs)
+
+    async def create_indexes(self, indexes: list):
+        return await self._connection.run(self._collection.create_indexes, indexes)
+
+    async def drop_indexes(self):
+        return await self._connection.run(self._collection.drop_indexes)
+
+
 class LegendsConnection:
-    def __init__(self, url: str, database: str):
+    def __init__(self, url: str, database: str, *, pool_size: int = 100, concurrency: int = 8):
         url = url.replace('[dbname]', database)
-        self.client = pymongo.MongoClient(url)
+        self.client = pymongo.MongoClient(url, maxPoolSize=pool_size)
         self.db = self.client[database]
+        self.concurrency = concurrency
+        # pymongo is thread safe, blocking calls run here to keep the event loop free
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='legends-mongo')
+
+    async def run(self, func: typing.Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def world(self, name: str) -> 'LegendsConnection':
+        if not _world_regex.match(name):
+            raise ValueError(f'Invalid world name {name}, only letters, digits, _ and - are allowed')
+        connection = copy.copy(self)
+        connection.db = self.client[f'{self.db.name}_{name}']
+        return connection
+
+    def collection(self, name: str) -> AsyncCollection:
+        return AsyncCollection(self, name)
+
+    def close(self):
+        self._executor.shutdown()
+        self.client.close()
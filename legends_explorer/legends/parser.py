@@ -1,20 +1,84 @@
+import asyncio
+import cProfile
+import functools
+import itertools
+import json
 import typing
-from xml.etree.ElementTree import parse as parse_xml, Element
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from bolinette import blnt
 from bolinette.exceptions import InternalError
 from bolinette.utils import paths
 
-from legends_explorer.legends import LegendsConnection, definitions
+from legends_explorer.legends import LegendsConnection, BatchWriter, ParquetSink, Collection, definitions
+from legends_explorer.legends.cache import ParseCache
+from legends_explorer.legends.event_index import EventIndex
+from legends_explorer.legends.export import export_formats, pyarrow
+from legends_explorer.legends.graph import RelationshipGraph
+from legends_explorer.legends.profiler import profiler
+from legends_explorer.legends.reader import Chunk, Document, Reader, get_reader, scan_document, split_section
+from legends_explorer.legends.summaries import SummaryBuilder, summarized
+from legends_explorer.legends.timeline import Timeline, chronological
+from legends_explorer.legends.types import path_formats
+from legends_explorer.legends.vocabulary import Vocabulary
+
+
+def parse_chunk(chunk: Chunk, *, backend: str = None, profile: bool = False, cprofile: bool = False,
+                trace_memory: bool = False) -> typing.Tuple[typing.List[dict], dict]:
+    # forked workers inherit the parent's counters, only report this chunk's
+    profiler.reset()
+    profiler.enabled = profile
+    entity = definitions[chunk.section].root
+    entities = []
+    with profiler.worker(cprofile=cprofile, trace_memory=trace_memory):
+        for _, elem in profiler.records(get_reader(backend).read_records(chunk)):
+            with profiler.timer(chunk.section, 'parse'):
+                entities.append(entity.parse(elem))
+    return entities, profiler.collect()
 
 
 class LegendsParser:
-    def __init__(self, context: blnt.BolinetteContext):
+    def __init__(self, context: blnt.BolinetteContext, *, world: str = None):
         self.context = context
         self.mongo: LegendsConnection = self.context['df_mongo']
-        self._parsers = definitions
+        if world is not None:
+            try:
+                self.mongo = self.mongo.world(world)
+            except ValueError as e:
+                raise InternalError(str(e))
+            self.context.logger.debug(f'Using database {self.mongo.db.name}')
+        # fresh collections, nothing parsed by another run in this process leaks into this one
+        self._parsers = {name: collection.fresh() for name, collection in definitions.items()}
+        self._reader: Reader = get_reader()
+        self._cprofile = False
+
+    async def parse(self, path: str, region: str, *, profile: str = None, cprofile: str = None,
+                    trace_memory: bool = False, **kwargs):
+        if profile is not None:
+            profiler.start(trace_memory=trace_memory)
+        cprof = cProfile.Profile() if cprofile is not None else None
+        self._cprofile = cprof is not None
+        if cprof is not None:
+            cprof.enable()
+        try:
+            await self._import(path, region, **kwargs)
+        finally:
+            if cprof is not None:
+                cprof.disable()
+                profiler.cprofile_stats(cprof).dump_stats(cprofile)
+                self.context.logger.debug(f'Wrote cProfile stats to {cprofile}')
+            report = profiler.stop() if profiler.enabled else None
+            self._log_issues()
+            if report is not None:
+                self._write_report(profile, report)
 
-    async def parse(self, path: str, region: str, *, parse: str = None, drop: str = None, insert: bool = False):
+    async def _import(self, path: str, region: str, *, parse: str = None, drop: str = None, insert: bool = False,
+                      batch: int = None, jobs: int = None, backend: str = None, compact: bool = False,
+                      path_format: str = 'points', sync: bool = False, cache: bool = False, summaries: bool = False,
+                      event_index: bool = False, export: str = None, timeline: bool = False, graph: bool = False,
+                      codes: bool = False):
+        self._reader = get_reader(backend)
+        self.context.logger.debug(f'Using {self._reader.name} XML backend')
         if parse != '*':
             parse = parse.split(',')
         else:
@@ -23,53 +87,380 @@ class LegendsParser:
             raise InternalError(f'{path} does not exist')
         if drop is not None:
             await self._drop(drop)
-        await self._parse_legends(path, region, parse_only=parse)
-        await self._parse_legends_plus(path, region, parse_only=parse)
-        if insert:
+        if path_format not in path_formats:
+            raise InternalError(f'Unknown path format {path_format}, expected one of {", ".join(path_formats)}')
+        if export is not None:
+            self._check_export(export, path_format)
+        if codes and not insert and not sync:
+            self.context.logger.warning('Category codes are only stored in the database, not encoding categories')
+            codes = False
+        if summaries and not insert and not sync:
+            self.context.logger.warning('Summaries are only stored in the database, not building them')
+            summaries = False
+        if event_index and parse is not None and 'historical_events' not in parse:
+            self.context.logger.warning('Event index needs historical_events, not building it')
+            event_index = False
+        if event_index and not insert and not sync:
+            self.context.logger.warning('Event index is only stored in the database, not building it')
+            event_index = False
+        vocabulary = await self._load_vocabulary() if codes else None
+        for collection in self._parsers.values():
+            collection.configure(compact=compact, path_format=path_format, vocabulary=vocabulary)
+        events = None
+        if (event_index or summaries) and (parse is None or 'historical_events' in parse):
+            events = EventIndex()
+            self._parsers['historical_events'].observe(events.add)
+        if timeline and parse is not None and 'historical_events' not in parse:
+            self.context.logger.warning('Timeline needs historical_events, not building it')
+            timeline = False
+        if timeline and not insert and not sync:
+            self.context.logger.warning('Timeline is only stored in the database, not building it')
+            timeline = False
+        if graph and parse is not None and 'historical_figures' not in parse:
+            self.context.logger.warning('Relationship graph needs historical_figures, not building it')
+            graph = False
+        if graph and not insert and not sync:
+            self.context.logger.warning('Relationship graph is only stored in the database, not building it')
+            graph = False
+        # summaries, the timeline and the graph are built from the parsed entities, they cannot be streamed away
+        streamable = not sync and not cache and not summaries and not timeline and not graph
+        if export is not None and not insert and streamable:
+            self.context.logger.debug(f'Streaming to {export} while parsing')
+            sink = self._open_sink(path, region, path_format, stream_only=parse, stream=True)
+            await self._parse_files(path, region, parse_only=parse, final=True, jobs=jobs)
+            self._close_sink(sink)
+            return
+        if insert and batch is not None and streamable and export is None:
+            self.context.logger.debug(f'Streaming to database in batches of {batch}')
+            writer = await self._open_writer(batch, push_only=parse)
+            await self._parse_files(path, region, parse_only=parse, final=True, jobs=jobs)
+            await self._close_writer(writer)
+            self.context.logger.debug('Done writing to database')
+            if vocabulary is not None:
+                await self._write_vocabulary(vocabulary)
+            if event_index:
+                await self._write_event_index(events)
+            return
+        if cache:
+            await self._parse_cached(path, region, parse_only=parse, jobs=jobs, path_format=path_format)
+        else:
+            await self._parse_files(path, region, parse_only=parse, jobs=jobs)
+        # built before writing, streamed collections are emptied as they are written
+        built = self._build_summaries(parse, events) if summaries else None
+        # sorted before writing, events are inserted and exported in chronological order
+        buckets = self._build_timeline() if timeline else None
+        relationships = self._build_graph() if graph else None
+        if export is not None:
+            self.context.logger.debug(f'Exporting to {export}')
+            self._export(self._open_sink(path, region, path_format), export_only=parse)
+        if sync:
+            self.context.logger.debug('Synchronizing database')
+            await self._sync_to_mongo(region, sync_only=parse)
+            self.context.logger.debug('Done synchronizing database')
+        elif insert:
             self.context.logger.debug('Writing to database')
-            await self._push_to_mongo(push_only=parse)
+            if batch is not None:
+                await self._close_writer(await self._open_writer(batch, push_only=parse))
+            else:
+                await self._push_to_mongo(push_only=parse)
             self.context.logger.debug('Done writing to database')
+        if vocabulary is not None:
+            await self._write_vocabulary(vocabulary)
+        if built is not None:
+            await self._write_summaries(built)
+        if buckets is not None:
+            await self._write_timeline(buckets)
+        if relationships is not None:
+            await self._write_graph(relationships)
+        if event_index:
+            await self._write_event_index(events)
+
+    @staticmethod
+    def _check_export(export: str, path_format: str):
+        if export not in export_formats:
+            raise InternalError(f'Unknown export format {export}, expected one of {", ".join(export_formats)}')
+        if pyarrow is None:
+            raise InternalError(f'Exporting to {export} requires pyarrow, install it with pip install pyarrow')
+        if path_format == 'geojson':
+            raise InternalError(f'Paths cannot be exported to {export} as geojson, use points or packed')
+
+    def _open_sink(self, path: str, region: str, path_format: str, *, stream_only: typing.List[str] = None,
+                   stream: bool = False) -> ParquetSink:
+        roots = {name: parser.root for name, parser in self._parsers.items()}
+        sink = ParquetSink(paths.join(path, 'export'), region, roots, path_format=path_format)
+        if stream:
+            for name, parser in self._parsers.items():
+                if stream_only is None or name in stream_only:
+                    parser.stream_to(sink)
+        return sink
+
+    def _export(self, sink: ParquetSink, export_only: typing.List[str] = None):
+        for name, parser in self._parsers.items():
+            if export_only is None or name in export_only:
+                for entity in parser.entities():
+                    sink.write(name, entity)
+        self._close_sink(sink)
+
+    def _close_sink(self, sink: ParquetSink):
+        for parser in self._parsers.values():
+            parser.flush()
+        sink.close()
+        for name in self._parsers:
+            if sink.count(name) > 0:
+                self.context.logger.debug(f'Exported {name}: {sink.count(name)} entities to '
+                                          f'{len(sink.files(name))} files')
+
+    async def _load_vocabulary(self) -> Vocabulary:
+        documents = await self.mongo.collection('categories').find({}, {'_id': 0})
+        self.context.logger.debug(f'Encoding categories with {len(documents)} known values')
+        return Vocabulary(documents)
+
+    async def _write_vocabulary(self, vocabulary: Vocabulary):
+        added = vocabulary.added()
+        self.context.logger.debug(f'Inserting categories: {len(added)} new values')
+        collection = self.mongo.collection('categories')
+        if added:
+            await collection.insert_many(added)
+        await collection.create_index([('category', 1), ('code', 1)], unique=True)
+
+    def _build_summaries(self, parse_only: typing.List[str] = None,
+                         events: EventIndex = None) -> typing.Dict[str, typing.List[dict]]:
+        missing = [name for name in summarized if parse_only is not None and name not in parse_only]
+        if missing:
+            self.context.logger.warning(f'Summaries built without {", ".join(missing)}')
+        self.context.logger.debug('Building summaries')
+        with profiler.timer('summaries', 'build'):
+            return SummaryBuilder(self._parsers, events=events).build()
+
+    async def _write_summaries(self, summaries: typing.Dict[str, typing.List[dict]]):
+        for name, documents in summaries.items():
+            self.context.logger.debug(f'Inserting {name}: {len(documents)} summaries')
+            await self._replace_collection(name, documents, [('id', 1)])
+        self.context.logger.debug('Done inserting summaries')
+
+    def _build_timeline(self) -> Timeline:
+        self.context.logger.debug('Sorting historical_events')
+        events = self._parsers['historical_events']
+        with profiler.timer('historical_events', 'sort'):
+            events.sort(chronological, rank='order')
+        timeline = Timeline()
+        with profiler.timer('timeline', 'build'):
+            for order, event in enumerate(events.entities()):
+                timeline.add(event, order)
+        return timeline
+
+    async def _write_timeline(self, timeline: Timeline):
+        self.context.logger.debug(f'Inserting timeline: {len(timeline)} buckets')
+        await self._replace_collection('timeline', list(timeline.documents()), [('scale', 1), ('start', 1)])
+        self.context.logger.debug('Done inserting timeline')
+
+    def _build_graph(self) -> RelationshipGraph:
+        self.context.logger.debug('Building relationship graph')
+        with profiler.timer('hf_graph', 'build'):
+            return RelationshipGraph.build(self._parsers['historical_figures'].entities())
+
+    async def _write_graph(self, graph: RelationshipGraph):
+        documents = list(graph.documents())
+        self.context.logger.debug(f'Inserting hf_graph: {len(graph)} nodes, {documents[0]["edges"]} links')
+        await self._replace_collection('hf_graph', documents, [('name', 1), ('chunk', 1)])
+        self.context.logger.debug('Done inserting hf_graph')
+
+    async def _write_event_index(self, events: EventIndex):
+        self.context.logger.debug(f'Inserting event_index: {len(events)} references')
+        with profiler.timer('event_index', 'build'):
+            documents = list(events.documents())
+        await self._replace_collection('event_index', documents, [('kind', 1), ('ref', 1), ('first', 1)])
+        self.context.logger.debug('Done inserting event_index')
+
+    async def _replace_collection(self, name: str, documents: typing.List[dict], index: typing.List[tuple],
+                                  batch_size: int = 1000):
+        await self.mongo.run(self.mongo.db.drop_collection, name)
+        collection = self.mongo.collection(name)
+        with profiler.timer(name, 'insert'):
+            await asyncio.gather(*(collection.insert_many(documents[start:start + batch_size])
+                                   for start in range(0, len(documents), batch_size)))
+        await collection.create_index(index)
 
     async def _drop(self, args):
         if args == '*':
             self.context.logger.debug('Dropping all collections')
             for name in self._parsers:
-                self.mongo.db.drop_collection(name)
+                await self.mongo.run(self.mongo.db.drop_collection, name)
             self.context.logger.debug('Done dropping all collections')
         else:
             drop_cols = args.split(',')
-            cols = self.mongo.db.collection_names()
+            cols = await self.mongo.run(self.mongo.db.list_collection_names)
             for col in drop_cols:
                 if col in cols:
-                    self.mongo.db.drop_collection(col)
+                    await self.mongo.run(self.mongo.db.drop_collection, col)
+
+    def _select(self, file_path: str, parse_only: typing.List[str] = None) -> Document:
+        accept = functools.partial(self._accept, parse_only=parse_only)
+        document = scan_document(file_path).select(accept)
+        for section in document.sections:
+            profiler.count(section.tag, 'bytes', len(section))
+        return document
+
+    def _accept(self, tag: str, parse_only: typing.List[str] = None):
+        return self._get_collection(tag, parse_only) is not None
+
+    def _get_collection(self, tag: str, parse_only: typing.List[str] = None) -> typing.Optional[Collection]:
+        if tag in self._parsers and (parse_only is None or tag in parse_only):
+            self.context.logger.debug(f'Parsing {tag}')
+            return self._parsers[tag]
+        self.context.logger.debug(f'Not parsing {tag}')
+        return None
+
+    async def _parse_files(self, path: str, region: str, *, parse_only: typing.List[str] = None,
+                           final: bool = False, jobs: int = None):
+        # legends and legends_plus are always parsed in separate workers, an import takes the time of the larger one
+        await self._parse_parallel(path, region, parse_only=parse_only, final=final, jobs=max(jobs or 2, 2))
 
-    async def _parse_legends_file(self, file_path: str, parse_only: typing.List[str] = None):
+    async def _parse_cached(self, path: str, region: str, *, parse_only: typing.List[str] = None, jobs: int = None,
+                            path_format: str = 'points'):
+        sources = [paths.join(path, f'{region}-legends.xml'), paths.join(path, f'{region}-legends_plus.xml')]
+        for file_path in sources:
+            if not paths.exists(file_path):
+                raise InternalError(f'{file_path} does not exist')
+        cache = ParseCache(paths.join(path, 'cache'), sources, path_format=path_format)
+        names = [name for name in self._parsers if parse_only is None or name in parse_only]
+        missing = [name for name in names if name not in cache]
+        for name in names:
+            if name in cache:
+                self.context.logger.debug(f'Loading {name} from cache')
+                with profiler.timer(name, 'cache_load'):
+                    self._parsers[name].load(cache.load(name))
+        if not missing:
+            return
+        await self._parse_files(path, region, parse_only=missing, jobs=jobs)
+        for name in missing:
+            self.context.logger.debug(f'Caching {name}')
+            with profiler.timer(name, 'cache_save'):
+                cache.save(name, self._parsers[name].entities())
+        cache.commit()
+
+    async def _parse_parallel(self, path: str, region: str, *, parse_only: typing.List[str] = None,
+                              final: bool = False, jobs: int):
+        legends = self._split_file(paths.join(path, f'{region}-legends.xml'), parse_only)
+        legends_plus = self._split_file(paths.join(path, f'{region}-legends_plus.xml'), parse_only)
+        sections = list(dict.fromkeys(chunk.section for chunk in legends + legends_plus))
+        queues = {}
+        for override, chunks in ((False, legends), (True, legends_plus)):
+            for section in sections:
+                queues[(section, override)] = [chunk for chunk in chunks if chunk.section == section]
+        self.context.logger.debug(f'Parsing {len(legends) + len(legends_plus)} chunks with {jobs} jobs')
+        parse_chunk_with = functools.partial(parse_chunk, backend=self._reader.name, profile=profiler.enabled,
+                                             cprofile=self._cprofile, trace_memory=profiler.trace_memory)
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {}
+            for section in sections:
+                pairs = itertools.zip_longest(queues[(section, False)], queues[(section, True)])
+                for index, pair in enumerate(pairs):
+                    for override, chunk in zip((False, True), pair):
+                        if chunk is not None:
+                            futures[pool.submit(parse_chunk_with, chunk)] = (section, override), index
+            results = {key: {} for key in queues}
+            positions = {key: 0 for key in queues}
+            for (section, override), chunks in queues.items():
+                if not chunks:
+                    self._parsers[section].complete(override=override, final=final)
+            try:
+                for future in as_completed(futures):
+                    key, index = futures.pop(future)
+                    results[key][index], stats = future.result()
+                    profiler.update(stats)
+                    section, override = key
+                    collection = self._parsers[section]
+                    while positions[key] in results[key]:
+                        for entity in results[key].pop(positions[key]):
+                            collection.join(entity, override=override, final=final)
+                        positions[key] += 1
+                        if positions[key] == len(queues[key]):
+                            collection.complete(override=override, final=final)
+            except BaseException:
+                # a failed chunk is reported without waiting for the chunks still queued
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+        self.context.logger.debug('Done parsing chunks')
+
+    def _split_file(self, file_path: str, parse_only: typing.List[str] = None) -> typing.List[Chunk]:
         if not paths.exists(file_path):
             raise InternalError(f'{file_path} does not exist')
-        self.context.logger.debug(f'Parsing {file_path}')
-        tree = parse_xml(file_path)
-        root = tree.getroot()
-        for elem in root:  # type: Element
-            if elem.tag in self._parsers and (parse_only is None or elem.tag in parse_only):
-                self.context.logger.debug(f'Parsing {elem.tag}')
-                await self._parsers[elem.tag].parse(elem)
-            else:
-                self.context.logger.debug(f'Not parsing {elem.tag}')
-        self.context.logger.debug(f'Done parsing {file_path}')
+        self.context.logger.debug(f'Splitting {file_path}')
+        document = self._select(file_path, parse_only)
+        chunks = []
+        for section in document.sections:
+            chunks.extend(split_section(document, section))
+        return chunks
 
-    async def _parse_legends(self, path: str, region: str, parse_only: typing.List[str] = None):
-        file_path = paths.join(path, f'{region}-legends.xml')
-        await self._parse_legends_file(file_path, parse_only)
+    async def index(self, names: str = None, *, rebuild: bool = False):
+        if names is None or names == '*':
+            names = list(self._parsers)
+        else:
+            names = names.split(',')
+        for name in names:
+            if name not in self._parsers:
+                raise InternalError(f'Unknown collection {name}')
+        cols = await self.mongo.run(self.mongo.db.list_collection_names)
+        await asyncio.gather(*(self._create_indexes(name, rebuild=rebuild) for name in names if name in cols))
 
-    async def _parse_legends_plus(self, path: str, region: str, parse_only: typing.List[str] = None):
-        file_path = paths.join(path, f'{region}-legends_plus.xml')
-        await self._parse_legends_file(file_path, parse_only)
+    async def _create_indexes(self, name: str, *, rebuild: bool = False):
+        self.context.logger.debug(f'{"Rebuilding" if rebuild else "Building"} indexes of {name}')
+        await self._parsers[name].create_indexes(self.mongo, rebuild=rebuild)
+        self.context.logger.debug(f'Done indexing {name}')
 
     async def _push_to_mongo(self, push_only: typing.List[str] = None):
-        cols = self.mongo.db.collection_names()
+        cols = await self.mongo.run(self.mongo.db.list_collection_names)
+        inserts = []
         for name, parser in self._parsers.items():
             if name not in cols and (push_only is None or name in push_only):
                 self.context.logger.debug(f'Inserting {name}: {len(parser)} entities')
-                await parser.insert(self.mongo)
+                inserts.append(self._insert(name, parser))
             else:
                 self.context.logger.debug(f'Not inserting {name}')
+        await asyncio.gather(*inserts)
+
+    async def _insert(self, name: str, parser: Collection):
+        await parser.insert(self.mongo)
+        # indexes are built once the data is in, maintaining them during bulk inserts is slower
+        await self._create_indexes(name)
+
+    async def _sync_to_mongo(self, region: str, sync_only: typing.List[str] = None):
+        names = [name for name in self._parsers if sync_only is None or name in sync_only]
+        results = await asyncio.gather(*(self._parsers[name].sync(self.mongo, region) for name in names))
+        for name, counts in zip(names, results):
+            self.context.logger.debug(f'Synchronized {name}: ' + ', '.join(f'{v} {k}' for k, v in counts.items()))
+        await asyncio.gather(*(self._create_indexes(name) for name in names))
+
+    async def _open_writer(self, batch: int, push_only: typing.List[str] = None):
+        cols = await self.mongo.run(self.mongo.db.list_collection_names)
+        writer = BatchWriter(self.mongo, batch_size=batch, workers=self.mongo.concurrency).start()
+        for name, parser in self._parsers.items():
+            if name not in cols and (push_only is None or name in push_only):
+                parser.stream_to(writer)
+            else:
+                self.context.logger.debug(f'Not inserting {name}')
+        return writer
+
+    async def _close_writer(self, writer: BatchWriter):
+        for parser in self._parsers.values():
+            parser.flush()
+        writer.close()
+        names = [name for name in self._parsers if writer.count(name) > 0]
+        for name in names:
+            self.context.logger.debug(f'Inserted {name}: {writer.count(name)} entities')
+        await asyncio.gather(*(self._create_indexes(name) for name in names))
+
+    def _log_issues(self):
+        for kind, issues in profiler.issues.items():
+            for key, count in sorted(issues.items()):
+                self.context.logger.warning(f'{kind.replace("_", " ").capitalize()} {key}: {count} times')
+        profiler.issues.clear()
+
+    def _write_report(self, file_path: str, report: dict):
+        for name, stats in report['collections'].items():
+            timers = ', '.join(f'{phase} {values["time"]:.3f}s' for phase, values in stats['timers'].items())
+            self.context.logger.debug(f'Profiled {name}: {stats["counters"].get("records", 0)} records, {timers}')
+        with open(file_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        self.context.logger.debug(f'Wrote profile report to {file_path}')
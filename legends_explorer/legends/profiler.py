@@ -0,0 +1,196 @@
+import contextlib
+import cProfile
+import pstats
+import threading
+import time
+import tracemalloc
+import typing
+
+_lock = threading.Lock()
+
+
+class _Timer:
+    __slots__ = ('_stats', '_start')
+
+    def __init__(self, stats: typing.Dict[str, float]):
+        self._stats = stats
+        self._start = 0.
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        elapsed = time.perf_counter() - self._start
+        # writer threads time their inserts concurrently
+        with _lock:
+            self._stats['time'] = self._stats.get('time', 0.) + elapsed
+            self._stats['calls'] = self._stats.get('calls', 0) + 1
+
+
+class _WorkerStats:
+    """
+    cProfile stats of a worker, in the shape pstats.Stats loads them from
+    """
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self._trace_memory = False
+        self._null = contextlib.nullcontext()
+        self._timers: typing.Dict[str, typing.Dict[str, typing.Dict[str, float]]] = {}
+        self._counters: typing.Dict[str, typing.Dict[str, int]] = {}
+        self._issues: typing.Dict[str, typing.Dict[str, int]] = {}
+        self._workers_peak = 0
+        self._workers_cprofile: typing.List[dict] = []
+        self._started = 0.
+
+    def start(self, *, trace_memory: bool = False):
+        self.reset()
+        self.enabled = True
+        self._trace_memory = trace_memory
+        if trace_memory:
+            tracemalloc.start()
+        self._started = time.perf_counter()
+        return self
+
+    def stop(self) -> dict:
+        report = self.report()
+        if self._trace_memory:
+            tracemalloc.stop()
+        self.enabled = False
+        self._trace_memory = False
+        return report
+
+    @property
+    def trace_memory(self):
+        return self._trace_memory
+
+    def reset(self):
+        self._timers = {}
+        self._counters = {}
+        self._issues = {}
+        self._workers_peak = 0
+        self._workers_cprofile = []
+
+    @contextlib.contextmanager
+    def worker(self, *, cprofile: bool = False, trace_memory: bool = False):
+        """
+        Profiles the work of a pool process, collect() returns it with the timers
+        """
+        cprof = cProfile.Profile() if cprofile else None
+        if trace_memory:
+            # forked workers inherit the parent's traces
+            tracemalloc.stop()
+            tracemalloc.start()
+        if cprof is not None:
+            cprof.enable()
+        try:
+            yield
+        finally:
+            if cprof is not None:
+                cprof.disable()
+                cprof.create_stats()
+                self._workers_cprofile.append(cprof.stats)
+            if trace_memory:
+                self._workers_peak = max(self._workers_peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+
+    def timer(self, collection: str, phase: str):
+        if not self.enabled:
+            return self._null
+        # entries are created under the lock their updates take, writer threads time their first inserts together
+        with _lock:
+            stats = self._timers.setdefault(collection, {}).setdefault(phase, {})
+        return _Timer(stats)
+
+    def add_time(self, collection: str, phase: str, seconds: float, calls: int = 1):
+        if not self.enabled:
+            return
+        with _lock:
+            stats = self._timers.setdefault(collection, {}).setdefault(phase, {})
+            stats['time'] = stats.get('time', 0.) + seconds
+            stats['calls'] = stats.get('calls', 0) + calls
+
+    def count(self, collection: str, counter: str, value: int = 1):
+        if not self.enabled:
+            return
+        with _lock:
+            counters = self._counters.setdefault(collection, {})
+            counters[counter] = counters.get(counter, 0) + value
+
+    def records(self, records: typing.Iterator[typing.Tuple[str, typing.Any]]):
+        if not self.enabled:
+            yield from records
+            return
+        start = time.perf_counter()
+        for tag, elem in records:
+            self.add_time(tag, 'read', time.perf_counter() - start)
+            self.count(tag, 'records')
+            yield tag, elem
+            start = time.perf_counter()
+
+    def issue(self, kind: str, key: str):
+        with _lock:
+            issues = self._issues.setdefault(kind, {})
+            issues[key] = issues.get(key, 0) + 1
+
+    @property
+    def issues(self) -> typing.Dict[str, typing.Dict[str, int]]:
+        return self._issues
+
+    def collect(self) -> dict:
+        stats = {'timers': self._timers, 'counters': self._counters, 'issues': self._issues,
+                 'memory': self._workers_peak, 'cprofile': self._workers_cprofile}
+        self.reset()
+        return stats
+
+    def update(self, stats: dict):
+        for collection, phases in stats['timers'].items():
+            for phase, values in phases.items():
+                self.add_time(collection, phase, values.get('time', 0.), values.get('calls', 0))
+        for collection, counters in stats['counters'].items():
+            for counter, value in counters.items():
+                self.count(collection, counter, value)
+        for kind, issues in stats['issues'].items():
+            for key, value in issues.items():
+                current = self._issues.setdefault(kind, {})
+                current[key] = current.get(key, 0) + value
+        self._workers_peak = max(self._workers_peak, stats.get('memory', 0))
+        self._workers_cprofile.extend(stats.get('cprofile', ()))
+
+    def cprofile_stats(self, cprof: cProfile.Profile) -> pstats.Stats:
+        """
+        Combines the stats of the process with the ones of the workers it got results from
+        """
+        stats = pstats.Stats(cprof)
+        for worker_stats in self._workers_cprofile:
+            stats.add(_WorkerStats(worker_stats))
+        self._workers_cprofile = []
+        return stats
+
+    def report(self) -> dict:
+        collections = {}
+        for collection in list(self._timers) + list(self._counters):
+            collections[collection] = {
+                'timers': self._timers.get(collection, {}),
+                'counters': self._counters.get(collection, {})
+            }
+        report = {
+            'elapsed': time.perf_counter() - self._started,
+            'collections': collections,
+            'issues': {kind: dict(issues) for kind, issues in self._issues.items()}
+        }
+        if self._trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            report['memory'] = {'current': current, 'peak': peak, 'workers_peak': self._workers_peak}
+        return report
+
+
+profiler = Profiler()
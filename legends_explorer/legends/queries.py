@@ -0,0 +1,349 @@
+import asyncio
+import time
+import typing
+from collections import OrderedDict
+
+from legends_explorer.legends import LegendsConnection, spatial
+from legends_explorer.legends.collection import content_hash
+from legends_explorer.legends.definitions import definitions
+from legends_explorer.legends.graph import RelationshipGraph
+from legends_explorer.legends.references import event_references
+from legends_explorer.legends.types import Int
+from legends_explorer.legends.vocabulary import Vocabulary
+
+_missing = object()
+
+
+class Cached:
+    __slots__ = ('data', 'etag')
+
+    def __init__(self, data, etag: str):
+        self.data = data
+        self.etag = etag
+
+
+class ReadCache:
+    def __init__(self, *, max_size: int = 1024, ttl: float = 60.):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: typing.OrderedDict[tuple, typing.Tuple[float, typing.Any]] = OrderedDict()
+        self._pending: typing.Dict[tuple, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def ttl(self):
+        return self._ttl
+
+    def get(self, key: tuple, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: tuple, value):
+        self._entries[key] = time.monotonic() + self._ttl, value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def fetch(self, key: tuple, load: typing.Callable[[], typing.Awaitable]):
+        value = self.get(key, _missing)
+        if value is not _missing:
+            self.hits += 1
+            return value
+        # concurrent misses on a hot key wait for the same query instead of all hitting the database
+        if key in self._pending:
+            self.hits += 1
+            return await asyncio.shield(self._pending[key])
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # asyncio logs errors of futures nobody awaited
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(key)
+        self.put(key, value)
+        future.set_result(value)
+        return value
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# collections written by the importer next to the parsed ones, keyed by id
+summary_collections = ['hf_summaries', 'site_summaries', 'entity_summaries']
+# collections holding the names of relationship graph nodes
+node_collections = {'hf': 'historical_figures', 'entity': 'entities', 'site': 'sites'}
+
+
+class LegendsQueries:
+    def __init__(self, mongo: LegendsConnection, cache: ReadCache, *, max_limit: int = 500):
+        self._mongo = mongo
+        self._cache = cache
+        self._max_limit = max_limit
+        self._keys: typing.Dict[str, typing.Tuple[str, bool]] = {}
+        for name, collection in definitions.items():
+            merge_id = collection.root.merge_id
+            self._keys[name] = merge_id, isinstance(collection.root[merge_id], Int)
+        for name in summary_collections:
+            self._keys[name] = 'id', True
+        self._layers = [name for name, collection in definitions.items() if collection.geometry]
+        # loaded graphs are kept per database until it is imported again, they are too large for the read cache
+        self._graphs: typing.Dict[str, typing.Tuple[typing.Optional[str], RelationshipGraph]] = {}
+        self._graph_lock = asyncio.Lock()
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def max_limit(self):
+        return self._max_limit
+
+    @property
+    def layers(self):
+        return self._layers
+
+    def readable(self, name: str):
+        return name in self._keys
+
+    def key_field(self, name: str) -> str:
+        return self._keys[name][0]
+
+    def parse_key(self, name: str, value: str):
+        if self._keys[name][1]:
+            return int(value)
+        return value
+
+    def connection(self, world: typing.Optional[str]) -> LegendsConnection:
+        if world is None:
+            return self._mongo
+        return self._mongo.world(world)
+
+    @staticmethod
+    def _projection(key: str, fields: typing.Optional[typing.Tuple[str, ...]],
+                    include: typing.Tuple[str, ...] = ()) -> dict:
+        if not fields:
+            # tiles only serve the spatial index
+            return {'_id': 0, '_region': 0, '_hash': 0, 'tiles': 0}
+        return dict({'_id': 0, key: 1}, **{field: 1 for field in fields + include})
+
+    async def vocabulary(self, *, world: str = None) -> typing.Optional[Vocabulary]:
+        mongo = self.connection(world)
+
+        async def load():
+            documents = await mongo.collection('categories').find({}, {'_id': 0})
+            return Vocabulary(documents) if documents else None
+        return await self._cache.fetch((mongo.db.name, 'categories'), load)
+
+    async def _decode(self, name: str, documents: typing.List[dict], world: typing.Optional[str]) -> typing.List[dict]:
+        # imported with codes, categories are given back as their values
+        if name not in definitions or not definitions[name].root.translates:
+            return documents
+        vocabulary = await self.vocabulary(world=world)
+        if vocabulary is None:
+            return documents
+        root = definitions[name].root
+        return [root.translate(document, vocabulary.decode) for document in documents]
+
+    async def page(self, name: str, *, world: str = None, after=None, limit: int = 50,
+                   fields: typing.Tuple[str, ...] = None) -> Cached:
+        mongo = self.connection(world)
+        key = self.key_field(name)
+        limit = min(limit, self._max_limit)
+
+        async def load():
+            query = {} if after is None else {key: {'$gt': after}}
+            documents = await mongo.collection(name).find(query, self._projection(key, fields),
+                                                          sort=[(key, 1)], limit=limit)
+            documents = await self._decode(name, documents, world)
+            last = documents[-1][key] if len(documents) == limit else None
+            data = {'items': documents, 'next': last, 'limit': limit}
+            return Cached(data, content_hash(data))
+        return await self._cache.fetch((mongo.db.name, name, 'page', after, limit, fields), load)
+
+    async def document(self, name: str, value, *, world: str = None,
+                       fields: typing.Tuple[str, ...] = None) -> typing.Optional[Cached]:
+        mongo = self.connection(world)
+        key = self.key_field(name)
+
+        async def load():
+            document = await mongo.collection(name).find_one({key: value}, self._projection(key, fields))
+            if document is None:
+                return None
+            document, = await self._decode(name, [document], world)
+            return Cached(document, content_hash(document))
+        return await self._cache.fetch((mongo.db.name, name, 'document', value, fields), load)
+
+    async def _cells(self, name: str, cells: spatial.Box, *, world: str = None,
+                     fields: typing.Tuple[str, ...] = None) -> typing.List[dict]:
+        mongo = self.connection(world)
+        key = self.key_field(name)
+
+        async def load():
+            tiles = [spatial.tile_id(tile_x, tile_y) for tile_x in range(cells[0], cells[2] + 1)
+                     for tile_y in range(cells[1], cells[3] + 1)]
+            query = {'tiles': {'$in': tiles}} if len(tiles) > 1 else {'tiles': tiles[0]}
+            documents = await mongo.collection(name).find(query, self._projection(key, fields, ('bbox',)),
+                                                          sort=[(key, 1)])
+            return await self._decode(name, documents, world)
+        return await self._cache.fetch((mongo.db.name, name, 'cells', cells, fields), load)
+
+    async def viewport(self, box: spatial.Box, *, layers: typing.List[str] = None, world: str = None,
+                       fields: typing.Tuple[str, ...] = None) -> Cached:
+        # snapped to whole map cells, viewports panned within the same cells share cached documents
+        size = spatial.tile_size
+        cells = box[0] // size, box[1] // size, box[2] // size, box[3] // size
+        layers = layers or self._layers
+        results = await asyncio.gather(*(self._cells(name, cells, world=world, fields=fields) for name in layers))
+        data = {}
+        for name, documents in zip(layers, results):
+            data[name] = [document for document in documents if spatial.intersects(document['bbox'], box)]
+        return Cached(data, content_hash(data))
+
+    async def histogram(self, start: int, end: int, *, scale: str = 'year', types: typing.Tuple[str, ...] = None,
+                        world: str = None) -> Cached:
+        mongo = self.connection(world)
+
+        async def load():
+            buckets = await mongo.collection('timeline').find(
+                {'scale': scale, 'start': {'$lte': end}, 'end': {'$gte': start}},
+                {'_id': 0, 'first': 0, 'last': 0}, sort=[('start', 1)])
+            if types:
+                for bucket in buckets:
+                    bucket['types'] = [item for item in bucket['types'] if item['type'] in types]
+                    bucket['count'] = sum(item['count'] for item in bucket['types'])
+            data = {'scale': scale, 'buckets': buckets}
+            return Cached(data, content_hash(data))
+        return await self._cache.fetch((mongo.db.name, 'timeline', scale, start, end, types), load)
+
+    async def _types(self, types: typing.Tuple[str, ...], world: typing.Optional[str]) -> list:
+        vocabulary = await self.vocabulary(world=world)
+        category = definitions['historical_events'].root['type'].name
+        codes = [] if vocabulary is None else [vocabulary.code(category, value) for value in types]
+        return list(types) + [code for code in codes if code is not None]
+
+    async def _participant(self, mongo: LegendsConnection, kind: str, ref: int) -> dict:
+        postings = await mongo.collection('event_index').find({'kind': kind, 'ref': ref}, {'_id': 0, 'events': 1},
+                                                              sort=[('first', 1)])
+        if not postings:
+            # imported without --events, or nothing references it, the reference fields give the same answer
+            return {'$or': [{field: ref} for field in event_references[kind]]}
+        return {'id': {'$in': [event for posting in postings for event in posting['events']]}}
+
+    async def events(self, start: int, end: int, *, types: typing.Tuple[str, ...] = None,
+                     participant: typing.Tuple[str, int] = None, after: int = None, limit: int = 50,
+                     fields: typing.Tuple[str, ...] = None, world: str = None) -> Cached:
+        mongo = self.connection(world)
+        limit = min(limit, self._max_limit)
+
+        async def load():
+            # buckets give the range of chronological ranks, a single scan of the order index covers the years
+            buckets = await mongo.collection('timeline').find(
+                {'scale': 'year', 'start': {'$gte': start, '$lte': end}}, {'_id': 0})
+            data = {'items': [], 'next': None, 'limit': limit, 'total': 0 if participant is None else None}
+            if not buckets:
+                return Cached(data, content_hash(data))
+            order = {'$gte': min(bucket['first'] for bucket in buckets),
+                     '$lte': max(bucket['last'] for bucket in buckets)}
+            if after is not None:
+                order['$gt'] = after
+            query = {'order': order}
+            if types:
+                query['type'] = {'$in': await self._types(types, world)}
+            if participant is not None:
+                query.update(await self._participant(mongo, *participant))
+            documents = await mongo.collection('historical_events').find(
+                query, self._projection('id', fields, ('order',)), sort=[('order', 1)], limit=limit)
+            data['items'] = await self._decode('historical_events', documents, world)
+            data['next'] = documents[-1]['order'] if len(documents) == limit else None
+            if participant is None:
+                data['total'] = sum(item['count'] for bucket in buckets for item in bucket['types']
+                                    if not types or item['type'] in types)
+            return Cached(data, content_hash(data))
+        key = (mongo.db.name, 'timeline', 'events', start, end, types, participant, after, limit, fields)
+        return await self._cache.fetch(key, load)
+
+    async def graph(self, *, world: str = None) -> typing.Optional[RelationshipGraph]:
+        mongo = self.connection(world)
+        database = mongo.db.name
+
+        async def load_meta():
+            return await mongo.collection('hf_graph').find_one({'name': 'meta'}, {'_id': 0, 'digest': 1})
+        # only the small meta document goes through the cache, its digest changes when the graph is imported again
+        meta = await self._cache.fetch((database, 'hf_graph', 'meta'), load_meta)
+        if meta is None:
+            self._graphs.pop(database, None)
+            return None
+        async with self._graph_lock:
+            loaded = self._graphs.get(database)
+            if loaded is not None and loaded[0] == meta.get('digest'):
+                return loaded[1]
+            documents = await mongo.collection('hf_graph').find({}, {'_id': 0}, sort=[('name', 1), ('chunk', 1)])
+            graph = RelationshipGraph.from_documents(documents)
+            if graph is None:
+                self._graphs.pop(database, None)
+            else:
+                self._graphs[database] = meta.get('digest'), graph
+            return graph
+
+    async def _named(self, mongo: LegendsConnection, data: dict, nodes: typing.List[dict]) -> Cached:
+        refs: typing.Dict[str, typing.Set[int]] = {}
+        for node in nodes:
+            refs.setdefault(node['kind'], set()).add(node['id'])
+
+        async def names(kind: str):
+            documents = await mongo.collection(node_collections[kind]).find(
+                {'id': {'$in': sorted(refs[kind])}}, {'_id': 0, 'id': 1, 'name': 1})
+            return kind, {document['id']: document.get('name') for document in documents}
+        found = dict(await asyncio.gather(*(names(kind) for kind in refs)))
+        for node in nodes:
+            node['name'] = found[node['kind']].get(node['id'])
+        return Cached(data, content_hash(data))
+
+    async def neighborhood(self, hfid: int, hops: int, *, kinds: typing.Tuple[str, ...] = ('hf',),
+                           family: bool = False, world: str = None) -> typing.Optional[Cached]:
+        mongo = self.connection(world)
+
+        async def load():
+            graph = await self.graph(world=world)
+            start = None if graph is None else graph.node('hf', hfid)
+            if start is None:
+                return None
+            if family:
+                data = graph.family(start, hops, limit=self._max_limit)
+            else:
+                data = graph.neighborhood(start, hops, kinds=kinds, limit=self._max_limit)
+            return await self._named(mongo, data, data['nodes'])
+        return await self._cache.fetch((mongo.db.name, 'hf_graph', hfid, hops, kinds, family), load)
+
+    async def path(self, source: int, target: int, *, kinds: typing.Tuple[str, ...] = ('hf',), max_depth: int = 6,
+                   world: str = None) -> typing.Optional[Cached]:
+        mongo = self.connection(world)
+
+        async def load():
+            graph = await self.graph(world=world)
+            if graph is None or graph.node('hf', source) is None or graph.node('hf', target) is None:
+                return None
+            steps = graph.path(graph.node('hf', source), graph.node('hf', target), kinds=kinds, max_depth=max_depth)
+            data = {'found': steps is not None, 'steps': steps or []}
+            nodes = [step[end] for step in data['steps'] for end in ('source', 'target')]
+            return await self._named(mongo, data, nodes)
+        return await self._cache.fetch((mongo.db.name, 'hf_graph', 'path', source, target, kinds, max_depth), load)
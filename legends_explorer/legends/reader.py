@@ -0,0 +1,321 @@
+import codecs
+import io
+import mmap
+import re
+import typing
+import xml.sax
+from abc import ABC, abstractmethod
+from xml.etree.ElementTree import iterparse, Element, TreeBuilder
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+
+_start_tag_regex = re.compile(rb'<([A-Za-z_][\w.-]*)\s*(/?)>')
+_encoding_regex = re.compile(rb'encoding=["\']([A-Za-z0-9._-]+)["\']')
+
+Records = typing.Iterator[typing.Tuple[str, Element]]
+
+
+class Section:
+    def __init__(self, tag: str, start: int, end: int, record: typing.Optional[str]):
+        self.tag = tag
+        self.start = start
+        self.end = end
+        self.record = record
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return f'<Section {self.tag} [{self.start}:{self.end}]>'
+
+
+class _RangesIO(io.RawIOBase):
+    def __init__(self, file_path: str, pieces: typing.List[typing.Union[bytes, typing.Tuple[int, int]]]):
+        super().__init__()
+        self._file = open(file_path, 'rb')
+        self._pieces = iter(pieces)
+        self._buffer = b''
+        self._remaining = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and self._remaining == 0:
+            piece = next(self._pieces, None)
+            if piece is None:
+                return 0
+            if isinstance(piece, bytes):
+                self._buffer = piece
+            else:
+                self._file.seek(piece[0])
+                self._remaining = piece[1] - piece[0]
+        if self._buffer:
+            size = min(len(b), len(self._buffer))
+            b[:size] = self._buffer[:size]
+            self._buffer = self._buffer[size:]
+            return size
+        size = self._file.readinto(memoryview(b)[:min(len(b), self._remaining)])
+        if size == 0:
+            raise EOFError(f'Unexpected end of {self._file.name}')
+        self._remaining -= size
+        return size
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+class _Utf8IO(io.RawIOBase):
+    def __init__(self, stream: typing.BinaryIO, encoding: str):
+        super().__init__()
+        self._text = io.TextIOWrapper(stream, encoding=encoding)
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            text = self._text.read(len(b))
+            if not text:
+                return 0
+            self._buffer = text.encode('utf-8')
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def close(self):
+        self._text.close()
+        super().close()
+
+
+class Document:
+    def __init__(self, file_path: str, header: bytes, sections: typing.List[Section]):
+        self.file_path = file_path
+        self.header = header
+        self.sections = sections
+
+    @property
+    def record_tags(self) -> typing.Set[str]:
+        return {section.record for section in self.sections if section.record is not None}
+
+    def select(self, accept: typing.Callable[[str], bool]) -> 'Document':
+        return Document(self.file_path, self.header, [section for section in self.sections if accept(section.tag)])
+
+    @property
+    def encoding(self) -> str:
+        match = _encoding_regex.search(self.header)
+        return 'utf-8' if match is None else codecs.lookup(match.group(1).decode()).name
+
+    def open(self) -> typing.BinaryIO:
+        pieces = [self.header, b'<df_world>']
+        for section in self.sections:
+            tag = section.tag.encode()
+            pieces.extend([b'<' + tag + b'>', (section.start, section.end), b'</' + tag + b'>'])
+        pieces.append(b'</df_world>')
+        return io.BufferedReader(_RangesIO(self.file_path, pieces), buffer_size=1024 * 1024)
+
+    def __repr__(self):
+        return f'<Document {self.file_path} {self.sections}>'
+
+
+class Chunk(Document):
+    def __init__(self, file_path: str, header: bytes, section: Section):
+        super().__init__(file_path, header, [section])
+
+    @property
+    def section(self):
+        return self.sections[0].tag
+
+
+class Reader(ABC):
+    name: str = None
+
+    @abstractmethod
+    def read_records(self, document: Document) -> Records:
+        pass
+
+
+class EtreeReader(Reader):
+    name = 'etree'
+
+    def read_records(self, document: Document) -> Records:
+        depth = 0
+        root: typing.Optional[Element] = None
+        section: typing.Optional[Element] = None
+        with document.open() as stream:
+            for event, elem in iterparse(stream, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if depth == 1:
+                        root = elem
+                    elif depth == 2:
+                        section = elem
+                    continue
+                if depth == 3:
+                    yield section.tag, elem
+                    section.clear()
+                elif depth == 2:
+                    root.clear()
+                    section = None
+                depth -= 1
+
+
+class LxmlReader(Reader):
+    name = 'lxml'
+
+    def __init__(self):
+        from lxml import etree
+        self._etree = etree
+
+    def read_records(self, document: Document) -> Records:
+        record_tags = document.record_tags
+        if not record_tags:
+            return
+        with self._open(document) as stream:
+            for _, elem in self._etree.iterparse(stream, events=('end',), tag=record_tags, huge_tree=True):
+                section = elem.getparent()
+                if section is None or section.getparent() is None or section.getparent().getparent() is not None:
+                    continue
+                yield section.tag, elem
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del section[0]
+
+    @staticmethod
+    def _open(document: Document) -> typing.BinaryIO:
+        encoding = document.encoding
+        if encoding in ('utf-8', 'ascii'):
+            return document.open()
+        # libxml2 does not know the CP437 of the legends dumps, it is given the text as UTF-8 without a declaration
+        stream = Document(document.file_path, b'', document.sections).open()
+        return io.BufferedReader(_Utf8IO(stream, encoding), buffer_size=1024 * 1024)
+
+
+class _RecordHandler(xml.sax.ContentHandler):
+    def __init__(self):
+        super().__init__()
+        self.records: typing.List[typing.Tuple[str, Element]] = []
+        self._depth = 0
+        self._section: typing.Optional[str] = None
+        self._builder: typing.Optional[TreeBuilder] = None
+
+    def startElement(self, name, attrs):
+        self._depth += 1
+        if self._depth == 2:
+            self._section = name
+        elif self._depth >= 3:
+            if self._depth == 3:
+                self._builder = TreeBuilder()
+            self._builder.start(name, dict(attrs))
+
+    def endElement(self, name):
+        if self._depth >= 3:
+            elem = self._builder.end(name)
+            if self._depth == 3:
+                self.records.append((self._section, elem))
+                self._builder = None
+        self._depth -= 1
+
+    def characters(self, content):
+        if self._builder is not None:
+            self._builder.data(content)
+
+
+class SaxReader(Reader):
+    name = 'sax'
+
+    def __init__(self, block_size: int = 1024 * 1024):
+        self._block_size = block_size
+
+    def read_records(self, document: Document) -> Records:
+        handler = _RecordHandler()
+        parser = xml.sax.make_parser()
+        parser.setContentHandler(handler)
+        with document.open() as stream:
+            while True:
+                block = stream.read(self._block_size)
+                if not block:
+                    break
+                parser.feed(block)
+                yield from handler.records
+                handler.records.clear()
+        parser.close()
+        yield from handler.records
+
+
+readers: typing.Dict[str, typing.Type[Reader]] = {
+    EtreeReader.name: EtreeReader,
+    LxmlReader.name: LxmlReader,
+    SaxReader.name: SaxReader
+}
+
+
+def get_reader(name: str = None) -> Reader:
+    if name is None:
+        name = EtreeReader.name
+    if name not in readers:
+        raise ValueError(f'Unknown XML backend {name}, expected one of {", ".join(readers)}')
+    try:
+        return readers[name]()
+    except ImportError:
+        return EtreeReader()
+
+
+def _record_tag(data, start: int, end: int) -> typing.Optional[str]:
+    match = _start_tag_regex.search(data, start, end)
+    if match is None:
+        return None
+    return match.group(1).decode()
+
+
+def scan_document(file_path: str) -> Document:
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        header = b''
+        pos = 0
+        if data[:5] == b'<?xml':
+            pos = data.find(b'?>') + 2
+            header = data[:pos]
+        sections = []
+        root = _start_tag_regex.search(data, pos)
+        if root is None or root.group(2):
+            return Document(file_path, header, sections)
+        pos = root.end()
+        while True:
+            pos = data.find(b'<', pos)
+            if pos < 0 or data[pos + 1:pos + 2] == b'/':
+                break
+            match = _start_tag_regex.match(data, pos)
+            if match is None:
+                pos += 1
+                continue
+            tag = match.group(1)
+            if match.group(2):
+                sections.append(Section(tag.decode(), match.end(), match.end(), None))
+                pos = match.end()
+                continue
+            end = data.find(b'</' + tag + b'>', match.end())
+            if end < 0:
+                break
+            sections.append(Section(tag.decode(), match.end(), end, _record_tag(data, match.end(), end)))
+            pos = end + len(tag) + 3
+        return Document(file_path, header, sections)
+
+
+def split_section(document: Document, section: Section, chunk_size: int = DEFAULT_CHUNK_SIZE) -> typing.List[Chunk]:
+    if len(section) <= chunk_size or section.record is None:
+        return [Chunk(document.file_path, document.header, section)]
+    with open(document.file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        # a record start tag is directly followed by its first child, unlike leaves sharing its name
+        record_regex = re.compile(b'<' + re.escape(section.record.encode()) + rb'>\s*<')
+        chunks = []
+        start = section.start
+        while start < section.end:
+            match = record_regex.search(data, start + chunk_size, section.end)
+            end = match.start() if match is not None else section.end
+            chunks.append(Chunk(document.file_path, document.header,
+                                Section(section.tag, start, end, section.record)))
+            start = end
+        return chunks
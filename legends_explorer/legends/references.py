@@ -0,0 +1,52 @@
+import typing
+
+# fields of historical events pointing to other records, by kind, as stored in the documents
+event_references: typing.Dict[str, typing.Tuple[str, ...]] = {
+    'hf': (
+        'hfids', 'trickster_hfid', 'hist_figure_id', 'slayer_hfid', 'student_hfid', 'teacher_hfid', 'hfid_target',
+        'target_hfid', 'corruptor_hfid', 'hfid1', 'hfid2', 'winner_hfid', 'competitor_hfids', 'gambler_hfid',
+        'giver_hist_figure_id', 'receiver_hist_figure_id', 'acquirer_hfid', 'seeker_hfid', 'speaker_hfid',
+        'site_hfid', 'implicated_hfids', 'trader_hfid', 'hist_fig_id', 'convicted_hfid', 'fooled_hfid',
+        'framer_hfid', 'group_1_hfid', 'group_2_hfids', 'group_hfids', 'leader_hfid', 'interrogator_hfid',
+        'wounder_hfid', 'woundee_hfid', 'attacker_general_hfid', 'defender_general_hfid', 'snatcher_hfid',
+        'ransomed_hfid', 'ransomer_hfid', 'payer_hfid', 'builder_hfid', 'persecutor_hfid', 'last_owner_hfid',
+        'actor_hfid', 'doer_hfid', 'attacker_hfid', 'expelled_hfids', 'instigator_hfid', 'pos_taker_hfid',
+        'property_confiscated_from_hfids', 'changee_hfid', 'changer_hfid', 'corrupt_convicter_hfid', 'plotter_hfid',
+        'lure_hfid', 'creator_hfid', 'coconspirator_hfid', 'new_leader_hfid', 'contact_hfid', 'overthrown_hfid',
+        'conspirator_hfids', 'modifier_hfid', 'saboteur_hfid', 'appointer_hfid', 'promise_to_hfid',
+        'identity_histfig_id', 'histfig', 'trickster', 'slayer_hf', 'victim_hf', 'hf', 'hf_target', 'victim',
+        'eater', 'wounder', 'woundee', 'builder_hf', 'changee', 'changer', 'group', 'student', 'teacher', 'doer',
+        'sanctify_hf', 'bodies_list'
+    ),
+    'site': (
+        'site_id', 'source_site_id', 'dest_site_id', 'moved_to_site_id', 'site_id1', 'site_id2', 'site_id_1',
+        'site_id_2', 'site', 'stash_site'
+    ),
+    'entity': (
+        'civ_id', 'dest_entity_id', 'source_entity_id', 'target_enid', 'entity_id', 'giver_entity_id',
+        'receiver_entity_id', 'entity_1', 'entity_2', 'joiner_entity_ids', 'convicter_enid', 'joined_entity_id',
+        'site_civ_id', 'confessed_after_apb_arrest_enid', 'attacker_civ_id', 'defender_civ_id',
+        'attacker_merc_enid', 'resident_civ_id', 'persecutor_enid', 'relevant_entity_id', 'join_entity_id',
+        'entity_id_1', 'entity_id_2', 'initiating_enid', 'joining_enids', 'arresting_enid', 'site_entity_id',
+        'civ_entity_id', 'new_site_civ_id', 'acquirer_enid', 'defender_merc_enid', 'trader_entity_id',
+        'religion_id', 'd_support_merc_enid', 'a_support_merc_enid', 'destroyer_enid', 'civ', 'entity', 'site_civ',
+        'victim_entity'
+    ),
+    'artifact': ('artifact_id', 'artifact')
+}
+
+
+_field_kinds = {field: kind for kind, fields in event_references.items() for field in fields}
+
+
+def references(event: dict) -> typing.Iterator[typing.Tuple[str, int]]:
+    seen = set()
+    for field, value in event.items():
+        kind = _field_kinds.get(field)
+        if kind is None or value is None:
+            continue
+        for ref in (value if isinstance(value, list) else (value,)):
+            # -1 is how the dumps say "nobody"
+            if isinstance(ref, int) and ref >= 0 and (kind, ref) not in seen:
+                seen.add((kind, ref))
+                yield kind, ref
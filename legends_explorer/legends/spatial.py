@@ -0,0 +1,53 @@
+import typing
+from array import array
+
+from legends_explorer.legends.types import ParsingType, Coordinates, Path
+
+# world tiles per side of a map cell, documents list the cells their bounding box covers
+tile_size = 16
+
+Box = typing.Tuple[int, int, int, int]
+
+
+def bounds(p_type: ParsingType, value) -> typing.Optional[Box]:
+    if isinstance(p_type, Coordinates):
+        return value['x'], value['y'], value['x'], value['y']
+    if isinstance(p_type, Path):
+        if isinstance(value, array):
+            step = p_type.points
+            xs, ys = value[0::step], value[1::step]
+        else:
+            x, y = p_type.keys[:2]
+            xs, ys = [point[x] for point in value], [point[y] for point in value]
+        if not xs:
+            return None
+        return min(xs), min(ys), max(xs), max(ys)
+    return None
+
+
+def union(boxes: typing.Iterable[Box]) -> typing.Optional[Box]:
+    boxes = list(boxes)
+    if not boxes:
+        return None
+    return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes))
+
+
+def tile_id(tile_x: int, tile_y: int) -> int:
+    return tile_x << 16 | tile_y
+
+
+def tiles(box: Box, size: int = tile_size) -> typing.List[int]:
+    x0, y0, x1, y1 = box
+    return [tile_id(tile_x, tile_y) for tile_x in range(x0 // size, x1 // size + 1)
+            for tile_y in range(y0 // size, y1 // size + 1)]
+
+
+def intersects(bbox: dict, box: Box) -> bool:
+    x0, y0, x1, y1 = box
+    return bbox['x0'] <= x1 and bbox['x1'] >= x0 and bbox['y0'] <= y1 and bbox['y1'] >= y0
+
+
+def geometry(box: Box) -> dict:
+    x0, y0, x1, y1 = box
+    return {'bbox': {'x0': x0, 'y0': y0, 'x1': x1, 'y1': y1}, 'tiles': tiles(box)}
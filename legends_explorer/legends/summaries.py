@@ -0,0 +1,117 @@
+import typing
+
+from legends_explorer.legends import Collection
+from legends_explorer.legends.event_index import EventIndex
+
+# event types changing who holds a site, with the field naming the new holder
+site_owner_events = {
+    'created site': 'civ_id',
+    'reclaim site': 'civ_id',
+    'site taken over': 'attacker_civ_id',
+    'new site leader': 'attacker_civ_id',
+    'destroyed site': None
+}
+
+
+summarized = ['historical_figures', 'historical_events', 'sites', 'entities', 'artifacts']
+
+
+class SummaryBuilder:
+    def __init__(self, collections: typing.Dict[str, Collection], *, events: EventIndex = None):
+        self._documents = {name: list(collections[name].entities()) for name in summarized if name in collections}
+        self._names = {kind: self._index(name) for kind, name in
+                       (('hf', 'historical_figures'), ('site', 'sites'), ('entity', 'entities'),
+                        ('artifact', 'artifacts'))}
+        if events is None:
+            events = EventIndex()
+            for event in self._documents.get('historical_events', []):
+                events.add(event)
+        self._events = events
+
+    def _index(self, name: str) -> typing.Dict[int, typing.Optional[str]]:
+        return {document['id']: document.get('name') for document in self._documents.get(name, [])}
+
+    def _name(self, kind: str, ref: int):
+        return self._names[kind].get(ref)
+
+    def build(self) -> typing.Dict[str, typing.List[dict]]:
+        return {
+            'hf_summaries': list(self.figures()),
+            'site_summaries': list(self.sites()),
+            'entity_summaries': list(self.entities())
+        }
+
+    def figures(self) -> typing.Iterator[dict]:
+        artifacts: typing.Dict[int, typing.List[int]] = {}
+        for artifact in self._documents.get('artifacts', []):
+            if artifact.get('holder_hfid') is not None:
+                artifacts.setdefault(artifact['holder_hfid'], []).append(artifact['id'])
+        for figure in self._documents.get('historical_figures', []):
+            hfid = figure['id']
+            held = sorted(set(artifacts.get(hfid, [])) | set(figure.get('holds_artifacts', [])))
+            yield {
+                'id': hfid, 'name': figure.get('name'), 'race': figure.get('race'),
+                'birth_year': figure.get('birth_year'), 'death_year': figure.get('death_year'),
+                'events': self._events.events('hf', hfid),
+                'hf_links': [{'link_type': link.get('link_type'), 'hfid': link.get('hfid'),
+                              'name': self._name('hf', link.get('hfid'))} for link in figure.get('hf_links', [])],
+                'entity_links': [{'link_type': link.get('link_type'), 'entity_id': link.get('entity_id'),
+                                  'name': self._name('entity', link.get('entity_id'))}
+                                 for link in figure.get('entity_links', [])],
+                'site_links': [{'link_type': link.get('link_type'), 'site_id': link.get('site_id'),
+                                'name': self._name('site', link.get('site_id'))}
+                               for link in figure.get('site_links', [])],
+                'artifacts': [{'id': ref, 'name': self._name('artifact', ref)} for ref in held]
+            }
+
+    def sites(self) -> typing.Iterator[dict]:
+        owners: typing.Dict[int, typing.List[dict]] = {}
+        for event in self._documents.get('historical_events', []):
+            if event.get('type') not in site_owner_events or event.get('site_id') is None:
+                continue
+            field = site_owner_events[event['type']]
+            civ_id = site_civ_id = None
+            if field is not None:
+                civ_id = event.get(field)
+                site_civ_id = event.get('new_site_civ_id', event.get('site_civ_id'))
+            owners.setdefault(event['site_id'], []).append({
+                'year': event.get('year'), 'event': event['id'], 'type': event['type'], 'civ_id': civ_id,
+                'site_civ_id': site_civ_id, 'name': self._name('entity', civ_id)
+            })
+        artifacts: typing.Dict[int, typing.List[int]] = {}
+        for artifact in self._documents.get('artifacts', []):
+            if artifact.get('site_id') is not None:
+                artifacts.setdefault(artifact['site_id'], []).append(artifact['id'])
+        for site in self._documents.get('sites', []):
+            site_id = site['id']
+            yield {
+                'id': site_id, 'name': site.get('name'), 'type': site.get('type'), 'coords': site.get('coords'),
+                'civ_id': site.get('civ_id'), 'civ_name': self._name('entity', site.get('civ_id')),
+                'cur_owner_id': site.get('cur_owner_id'),
+                'cur_owner_name': self._name('entity', site.get('cur_owner_id')),
+                'owners': sorted(owners.get(site_id, []), key=lambda owner: owner['event']),
+                'events': self._events.events('site', site_id),
+                'artifacts': [{'id': ref, 'name': self._name('artifact', ref)}
+                              for ref in sorted(artifacts.get(site_id, []))]
+            }
+
+    def entities(self) -> typing.Iterator[dict]:
+        members: typing.Dict[int, typing.List[dict]] = {}
+        for figure in self._documents.get('historical_figures', []):
+            for link in figure.get('entity_links', []):
+                members.setdefault(link.get('entity_id'), []).append({
+                    'hfid': figure['id'], 'name': figure.get('name'), 'link_type': link.get('link_type')
+                })
+        sites: typing.Dict[int, typing.Set[int]] = {}
+        for site in self._documents.get('sites', []):
+            for field in ('civ_id', 'cur_owner_id'):
+                if site.get(field) is not None:
+                    sites.setdefault(site[field], set()).add(site['id'])
+        for entity in self._documents.get('entities', []):
+            entity_id = entity['id']
+            yield {
+                'id': entity_id, 'name': entity.get('name'), 'race': entity.get('race'), 'type': entity.get('type'),
+                'members': members.get(entity_id, []),
+                'sites': [{'id': ref, 'name': self._name('site', ref)} for ref in sorted(sites.get(entity_id, ()))],
+                'events': self._events.events('entity', entity_id)
+            }
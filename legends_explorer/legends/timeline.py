@@ -0,0 +1,39 @@
+import typing
+
+scales = {'year': 1, 'decade': 10}
+
+
+def chronological(event: dict):
+    # events of the same year without seconds72 happened at an unknown time, they come first
+    seconds = event.get('seconds72')
+    return event.get('year', 0), -1 if seconds is None else seconds, event['id']
+
+
+class Timeline:
+    def __init__(self):
+        self._buckets: typing.Dict[typing.Tuple[str, int], dict] = {}
+
+    def add(self, event: dict, order: int):
+        year = event.get('year', 0)
+        for scale, size in scales.items():
+            start = year // size * size
+            bucket = self._buckets.get((scale, start))
+            if bucket is None:
+                bucket = self._buckets[scale, start] = {
+                    'scale': scale, 'start': start, 'end': start + size - 1, 'count': 0, 'first': order, 'last': order,
+                    'types': {}
+                }
+            bucket['count'] += 1
+            bucket['first'] = min(bucket['first'], order)
+            bucket['last'] = max(bucket['last'], order)
+            event_type = event.get('type')
+            bucket['types'][event_type] = bucket['types'].get(event_type, 0) + 1
+
+    def documents(self) -> typing.Iterator[dict]:
+        for (scale, start), bucket in sorted(self._buckets.items()):
+            # event types are free text, keep them out of field names
+            types = sorted(bucket['types'].items(), key=lambda item: (-item[1], str(item[0])))
+            yield dict(bucket, types=[{'type': event_type, 'count': count} for event_type, count in types])
+
+    def __len__(self):
+        return len(self._buckets)
@@ -1,9 +1,29 @@
-import re
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Union
+from array import array
+from itertools import islice
+from sys import intern
+from typing import Dict, Any, Union, Callable, Tuple
 from xml.etree.ElementTree import Element
 
-str_regex = re.compile('[\t\n ]')
+from legends_explorer.legends.profiler import profiler
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+path_formats = ['points', 'packed', 'geojson']
+
+# translates a category value, given the name of the category
+Translate = Callable[[str, Any], Any]
+
+
+def _hashable(value):
+    if isinstance(value, dict):
+        return tuple(value.items())
+    if isinstance(value, (list, array)):
+        return tuple(value)
+    return value
 
 
 class ParsingType(ABC):
@@ -11,6 +31,37 @@ class ParsingType(ABC):
     def merge(self, origin, override):
         pass
 
+    def pack(self, value):
+        return value
+
+    def unpack(self, value):
+        return value
+
+    def dump(self, value, path_format: str):
+        return value
+
+    def translate(self, value, translate: Translate):
+        return value
+
+    @property
+    def packs(self):
+        return type(self).pack is not ParsingType.pack
+
+    @property
+    def dumps(self):
+        return type(self).dump is not ParsingType.dump
+
+    @property
+    def translates(self):
+        return type(self).translate is not ParsingType.translate
+
+
+class Record(tuple):
+    __slots__ = ()
+
+    def items(self):
+        return zip(self[0], islice(self, 1, None))
+
 
 class BasicType(ParsingType, ABC):
     @abstractmethod
@@ -55,22 +106,42 @@ class Str(BasicType):
         return elem.text
 
     def merge(self, origin, override):
-        new_str = str_regex.sub('', override)
-        if len(new_str) > 0:
+        if override.strip('\t\n '):
             return override
         return origin
 
 
+class Category(Str):
+    def __init__(self, name: str):
+        self._name = name
+
+    @property
+    def name(self):
+        return self._name
+
+    def parse(self, elem: Element):
+        text = elem.text
+        if text is None:
+            return text
+        return intern(text)
+
+    def translate(self, value, translate: Translate):
+        return translate(self._name, value)
+
+
 class SplitStr(BasicType):
     def __init__(self, char: str):
         self._char = char
 
+    @property
+    def char(self):
+        return self._char
+
     def parse(self, elem: Element):
         return elem.text.split(self._char)
 
     def merge(self, origin, override):
-        print('*** Unsupported merge type GroupTree')
-        return origin
+        return override or origin
 
 
 class Population(BasicType):
@@ -81,6 +152,12 @@ class Population(BasicType):
     def merge(self, origin, override):
         return override
 
+    def pack(self, value):
+        return value['race'], value['population']
+
+    def unpack(self, value):
+        return {'race': value[0], 'population': value[1]}
+
 
 class Coordinates(BasicType):
     def parse(self, elem: Element):
@@ -92,30 +169,88 @@ class Coordinates(BasicType):
     def merge(self, origin, override):
         return override
 
+    def pack(self, value):
+        return value['x'], value['y']
+
+    def unpack(self, value):
+        return {'x': value[0], 'y': value[1]}
+
 
 class Path(BasicType):
+    vectorize_above = 256
+
     def __init__(self, *, points: int = 2):
         self._points = points
         if points > 3:
             self._origin_point = ord('a')
         else:
             self._origin_point = ord('x')
+        ord_a = ord('a')
+        self._keys = [chr((self._origin_point - ord_a + index) % 26 + ord_a) for index in range(points)]
+
+    @property
+    def points(self):
+        return self._points
+
+    @property
+    def keys(self):
+        return self._keys
 
     def parse(self, elem: Element):
+        text = elem.text
+        if not text:
+            return array('i')
+        coords = [coord for coord in text.split('|') if coord]
+        if numpy is not None and len(text) > self.vectorize_above:
+            values = numpy.array(','.join(coords).split(','), dtype=numpy.int32)
+            if len(values) == len(coords) * self._points:
+                return array('i', values.tobytes())
+        else:
+            values = array('i', map(int, ','.join(coords).split(','))) if coords else array('i')
+            if len(values) == len(coords) * self._points:
+                return values
+        return self._parse_points(coords)
+
+    def _parse_points(self, coords):
         ord_a = ord('a')
         path = []
-        for coord in elem.text.split('|'):
-            if coord:
-                points = coord.split(',')
-                coords = {}
-                for index in range(len(points)):
-                    coords[chr((self._origin_point - ord_a + index) % 26 + ord_a)] = int(points[index])
-                path.append(coords)
+        for coord in coords:
+            points = coord.split(',')
+            path.append(dict((chr((self._origin_point - ord_a + index) % 26 + ord_a), int(point))
+                             for index, point in enumerate(points)))
         return path
 
     def merge(self, origin, override):
         return override
 
+    def pack(self, value):
+        if isinstance(value, array) or any(len(point) != self._points for point in value):
+            return value
+        return array('i', (coord for point in value for coord in point.values()))
+
+    def dump(self, value, path_format: str):
+        if isinstance(value, array):
+            step = self._points
+            if path_format == 'packed':
+                return value.tolist()
+            positions = [value[index:index + step].tolist() for index in range(0, len(value), step)]
+            if path_format == 'points':
+                keys = self._keys
+                return [dict(zip(keys, position)) for position in positions]
+        elif path_format == 'points':
+            return value
+        else:
+            positions = [list(point.values()) for point in value]
+            if path_format == 'packed':
+                return [coord for position in positions for coord in position]
+        if not positions:
+            return None
+        # geojson positions are x, y, the other values of wider points (river flow, elevation) are left out
+        positions = [position[:2] for position in positions]
+        if len(positions) == 1:
+            return {'type': 'Point', 'coordinates': positions[0]}
+        return {'type': 'LineString', 'coordinates': positions}
+
 
 class Rectangle(BasicType):
     def parse(self, elem: Element):
@@ -127,6 +262,12 @@ class Rectangle(BasicType):
     def merge(self, origin, override):
         return override
 
+    def pack(self, value):
+        return value['x0y0'], value['x0y1'], value['x1y0'], value['x1y1']
+
+    def unpack(self, value):
+        return {'x0y0': value[0], 'x0y1': value[1], 'x1y0': value[2], 'x1y1': value[3]}
+
 
 class Entity(ParsingType):
     def __init__(self, merge_id: str, fields: Dict[str, Union[BasicType, ComplexType]],
@@ -135,47 +276,145 @@ class Entity(ParsingType):
         self._fields = dict([(field, fields[field]) for field in fields if not isinstance(fields[field], GroupTree)])
         self._group_trees = [value for value in fields.values() if isinstance(value, GroupTree)]
         self._transforms = transforms
+        self._handlers: Dict[str, Callable[[Element, Element, Dict[str, Any]], None]] = {}
+        for tag in self._fields:
+            self._handlers[tag] = self._compile(tag)
+        for tag, target in (transforms or {}).items():
+            self._handlers[tag] = self._compile(target)
+        self._packers: Dict[str, ParsingType] = {}
+        self._dumpers: Dict[str, ParsingType] = {}
+        self._translators: Dict[str, ParsingType] = {}
+        for tag, p_type in self._fields.items():
+            if isinstance(p_type, LinkToPreviousGroupBy):
+                continue
+            if isinstance(p_type, GroupBy):
+                tag = p_type.group_key
+            if p_type.packs:
+                self._packers[tag] = p_type
+            if p_type.dumps:
+                self._dumpers[tag] = p_type
+            if p_type.translates:
+                self._translators[tag] = p_type
+        self._shapes: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        self._mergers: Dict[str, ParsingType] = {}
+        for tag, p_type in self._fields.items():
+            if isinstance(p_type, LinkToPreviousGroupBy):
+                group = next(value for value in self._fields.values()
+                             if isinstance(value, GroupBy) and value.group_key == p_type.group_key)
+                group.link(p_type)
+            elif isinstance(p_type, GroupBy):
+                self._mergers[p_type.group_key] = p_type
+            elif isinstance(p_type, ParsingType):
+                self._mergers[tag] = p_type
+        for group in self._group_trees:
+            self._mergers[group.group_key] = group
 
     @property
     def merge_id(self):
         return self._merge_id
 
+    @property
+    def group_trees(self):
+        return self._group_trees
+
+    def _compile(self, tag: str):
+        if tag in self._fields:
+            p_type = self._fields[tag]
+            if isinstance(p_type, BasicType):
+                parse_basic = p_type.parse
+
+                def handler(elem: Element, child: Element, fields: Dict[str, Any]):
+                    if tag in fields:
+                        profiler.issue('duplicated_key', f'{elem.tag}.{tag}')
+                    fields[tag] = parse_basic(child)
+            elif isinstance(p_type, ComplexType):
+                parse_complex = p_type.parse
+
+                def handler(elem: Element, child: Element, fields: Dict[str, Any]):
+                    if tag in fields:
+                        profiler.issue('duplicated_key', f'{elem.tag}.{tag}')
+                    parse_complex(child, parent_fields=fields)
+            else:
+                def handler(elem: Element, _: Element, fields: Dict[str, Any]):
+                    if tag in fields:
+                        profiler.issue('duplicated_key', f'{elem.tag}.{tag}')
+            return handler
+        for group in self._group_trees:
+            if group.test(tag):
+                parse_group = group.parse
+
+                def handler(_: Element, child: Element, fields: Dict[str, Any]):
+                    parse_group(child, parent_fields=fields)
+                return handler
+
+        def handler(elem: Element, *_):
+            profiler.issue('missing_def', f'{elem.tag}.{tag}')
+        return handler
+
+    def _resolve(self, tag: str):
+        if self._transforms is not None and tag in self._transforms:
+            handler = self._compile(self._transforms[tag])
+        else:
+            handler = self._compile(tag)
+        self._handlers[tag] = handler
+        return handler
+
     def parse(self, elem: Element):
         fields = {}
+        handlers = self._handlers
         for child in elem:  # type: Element
-            tag = child.tag
-            if self._transforms is not None and tag in self._transforms:
-                tag = self._transforms[tag]
-            if tag in self._fields:
-                if tag in fields:
-                    print('*** Duplicated key', elem.tag, tag)
-                p_type = self._fields[tag]
-                if isinstance(p_type, BasicType):
-                    fields[tag] = p_type.parse(child)
-                elif isinstance(p_type, ComplexType):
-                    p_type.parse(child, parent_fields=fields)
-            else:
-                for group in self._group_trees:
-                    if group.test(tag):
-                        group.parse(child, parent_fields=fields)
-                        break
-                else:
-                    print('*** Missing def', elem.tag, tag)
+            handler = handlers.get(child.tag)
+            if handler is None:
+                handler = self._resolve(child.tag)
+            handler(elem, child, fields)
         return fields
 
     def merge(self, origin, override):
-        new_obj = {}
-        for key, value in self:
-            if isinstance(value, (GroupBy, LinkToPreviousGroupBy)):
-                key = value.group_key
-            if key in origin and key not in override:
-                new_obj[key] = origin[key]
-            elif key not in origin and key in override:
-                new_obj[key] = override[key]
-            elif key in origin and key in override:
-                new_obj[key] = value.merge(origin[key], override[key])
+        new_obj = dict(origin)
+        mergers = self._mergers
+        for key, value in override.items():
+            if key in new_obj and key in mergers:
+                new_obj[key] = mergers[key].merge(new_obj[key], value)
+            else:
+                new_obj[key] = value
         return new_obj
 
+    def pack(self, value: Dict[str, Any]):
+        keys = tuple(value)
+        keys = self._shapes.setdefault(keys, keys)
+        packers = self._packers
+        return Record((keys, *(packers[key].pack(item) if key in packers else item for key, item in value.items())))
+
+    def unpack(self, value: Union[Record, Dict[str, Any]]):
+        if not isinstance(value, Record):
+            return value
+        packers = self._packers
+        return dict((key, packers[key].unpack(item) if key in packers else item) for key, item in value.items())
+
+    @property
+    def dumps(self):
+        return bool(self._dumpers)
+
+    def dump(self, value: Union[Record, Dict[str, Any]], path_format: str = 'points'):
+        document = self.unpack(value)
+        if self._dumpers:
+            document = dict(document)
+            for key, p_type in self._dumpers.items():
+                if key in document:
+                    document[key] = p_type.dump(document[key], path_format)
+        return document
+
+    @property
+    def translates(self):
+        return bool(self._translators)
+
+    def translate(self, value: Dict[str, Any], translate: Translate):
+        document = dict(value)
+        for key, p_type in self._translators.items():
+            if key in document:
+                document[key] = p_type.translate(document[key], translate)
+        return document
+
     def __getitem__(self, key: str):
         return self._fields[key]
 
@@ -190,35 +429,58 @@ class List(BasicType):
     def __init__(self, elem: Entity):
         self._elem = elem
 
+    @property
+    def elem(self):
+        return self._elem
+
     def parse(self, elem: Element):
         entities = []
         for child in elem:  # type: Element
             entities.append(self._elem.parse(child))
         return entities
 
+    @property
+    def dumps(self):
+        return self._elem.dumps
+
+    def pack(self, value):
+        return [self._elem.pack(item) for item in value]
+
+    def unpack(self, value):
+        return [self._elem.unpack(item) for item in value]
+
+    def dump(self, value, path_format: str):
+        return [self._elem.dump(item, path_format) for item in value]
+
+    @property
+    def translates(self):
+        return self._elem.translates
+
+    def translate(self, value, translate: Translate):
+        return [self._elem.translate(item, translate) for item in value]
+
     def merge(self, origin, override):
-        new_list = []
-        origin_items = dict(map(lambda e: (e[self._elem.merge_id], e), origin))
-        override_items = dict(map(lambda e: (e[self._elem.merge_id], e), override))
-        for _id in origin_items | override_items:
-            if _id in origin_items and _id not in override_items:
-                new_list.append(origin_items[_id])
-            elif _id not in origin_items and _id in override_items:
-                new_list.append(override_items[_id])
-            elif _id in origin_items and _id in override_items:
-                new_list.append(self._elem.merge(origin_items[_id], override_items[_id]))
-        return new_list
+        merge_id = self._elem.merge_id
+        items = {item[merge_id]: item for item in origin}
+        for _id, item in {item[merge_id]: item for item in override}.items():
+            items[_id] = self._elem.merge(items[_id], item) if _id in items else item
+        return list(items.values())
 
 
 class GroupBy(ComplexType):
     def __init__(self, key: str, elem: Union[BasicType, Entity]):
         self._key = key
         self._elem = elem
+        self._links: Dict[str, LinkToPreviousGroupBy] = {}
 
     @property
     def group_key(self):
         return self._key
 
+    @property
+    def elem(self):
+        return self._elem
+
     def parse(self, elem: Element, *, parent_fields):
         if parent_fields is None:
             return None
@@ -226,19 +488,65 @@ class GroupBy(ComplexType):
             parent_fields[self._key] = []
         parent_fields[self._key].append(self._elem.parse(elem))
 
+    @property
+    def packs(self):
+        return self._elem.packs
+
+    @property
+    def dumps(self):
+        return self._elem.dumps
+
+    def pack(self, value):
+        return [self._elem.pack(item) for item in value]
+
+    def unpack(self, value):
+        return [self._elem.unpack(item) for item in value]
+
+    def dump(self, value, path_format: str):
+        return [self._elem.dump(item, path_format) for item in value]
+
+    @property
+    def translates(self):
+        return self._elem.translates
+
+    def translate(self, value, translate: Translate):
+        return [self._elem.translate(item, translate) for item in value]
+
+    @property
+    def links(self):
+        return self._links
+
+    def link(self, link: 'LinkToPreviousGroupBy'):
+        self._links[link.key] = link
+
     def merge(self, origin, override):
+        if not isinstance(self._elem, Entity):
+            overridden = set(map(_hashable, override))
+            return [elem for elem in origin if _hashable(elem) not in overridden] + list(override)
+        # items sharing an id are paired in order, a figure can be linked twice to the same figure
+        merge_id = self._elem.merge_id
+        pending: Dict[Any, list] = {}
+        for index, item in enumerate(override):
+            pending.setdefault(item.get(merge_id), []).append(index)
         new_grp = []
-        if isinstance(self._elem, Entity):
-            print('*** Unsupported merge type GroupBy')
-            return origin
-        else:
-            for elem in origin:
-                if elem not in override:
-                    new_grp.append(elem)
-            for elem in override:
-                new_grp.append(elem)
+        used = set()
+        for item in origin:
+            indexes = pending.get(item.get(merge_id))
+            if indexes:
+                index = indexes.pop(0)
+                used.add(index)
+                item = self._merge_item(item, override[index])
+            new_grp.append(item)
+        new_grp.extend(item for index, item in enumerate(override) if index not in used)
         return new_grp
 
+    def _merge_item(self, origin, override):
+        item = self._elem.merge(origin, override)
+        for key, link in self._links.items():
+            if key in origin and key in override:
+                item[key] = link.merge(origin[key], override[key])
+        return item
+
 
 class LinkToPreviousGroupBy(ComplexType):
     def __init__(self, group_by_key: str, key: str, elem: Union[BasicType, Entity]):
@@ -250,6 +558,14 @@ class LinkToPreviousGroupBy(ComplexType):
     def group_key(self):
         return self._grp_key
 
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def elem(self):
+        return self._elem
+
     def parse(self, elem: Element, *, parent_fields):
         if parent_fields is None or self._grp_key not in parent_fields:
             return None
@@ -257,8 +573,7 @@ class LinkToPreviousGroupBy(ComplexType):
             parent_fields[self._grp_key][-1][self._key] = self._elem.parse(elem)
 
     def merge(self, origin, override):
-        print('*** Unsupported merge type LinkToPreviousGroupBy')
-        return origin
+        return self._elem.merge(origin, override)
 
 
 class Wrap(BasicType):
@@ -266,12 +581,20 @@ class Wrap(BasicType):
         self._key = wrapping_key
         self._elem = elem
 
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def elem(self):
+        return self._elem
+
     def parse(self, elem: Element):
         return {self._key: self._elem.parse(elem)}
 
     def merge(self, origin, override):
-        print('*** Unsupported merge type Wrap')
-        return origin
+        key = self._key
+        return {key: self._elem.merge(origin[key], override[key])}
 
 
 class GroupTree(ComplexType):
@@ -280,11 +603,27 @@ class GroupTree(ComplexType):
         self._depth = depth
         self._elem = elem
 
+    @property
+    def start(self):
+        return self._start
+
+    @property
+    def group_key(self):
+        return self._start[:-1]
+
+    @property
+    def depth(self):
+        return self._depth
+
+    @property
+    def elem(self):
+        return self._elem
+
     def test(self, tag: str):
         return tag.startswith(self._start)
 
     def parse(self, elem: Element, *, parent_fields):
-        path = [self._start[:-1]] + elem.tag[len(self._start):].split('_', maxsplit=self._depth - 1)
+        path = [self.group_key] + elem.tag[len(self._start):].split('_', maxsplit=self._depth - 1)
         collection = parent_fields
         for key in path[:-1]:
             if key not in collection:
@@ -293,5 +632,12 @@ class GroupTree(ComplexType):
         collection[path[-1]] = self._elem.parse(elem)
 
     def merge(self, origin, override):
-        print('*** Unsupported merge type GroupTree')
-        return origin
+        tree = dict(origin)
+        for key, value in override.items():
+            if key not in tree:
+                tree[key] = value
+            elif isinstance(value, dict) and isinstance(tree[key], dict):
+                tree[key] = self.merge(tree[key], value)
+            else:
+                tree[key] = self._elem.merge(tree[key], value)
+        return tree
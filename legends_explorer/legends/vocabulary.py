@@ -0,0 +1,41 @@
+import typing
+
+
+class Vocabulary:
+    def __init__(self, documents: typing.Iterable[dict] = ()):
+        self._codes: typing.Dict[str, typing.Dict[str, int]] = {}
+        self._values: typing.Dict[str, typing.Dict[int, str]] = {}
+        self._added: typing.List[dict] = []
+        for document in documents:
+            self._codes.setdefault(document['category'], {})[document['value']] = document['code']
+            self._values.setdefault(document['category'], {})[document['code']] = document['value']
+
+    def encode(self, category: str, value):
+        if not isinstance(value, str):
+            return value
+        codes = self._codes.get(category)
+        if codes is None:
+            codes = self._codes[category] = {}
+            self._values[category] = {}
+        code = codes.get(value)
+        if code is None:
+            # codes are only ever appended, documents written by earlier imports keep their meaning
+            code = codes[value] = len(codes)
+            self._values[category][code] = value
+            self._added.append({'category': category, 'code': code, 'value': value})
+        return code
+
+    def decode(self, category: str, value):
+        if not isinstance(value, int) or isinstance(value, bool):
+            return value
+        return self._values.get(category, {}).get(value, value)
+
+    def code(self, category: str, value: str) -> typing.Optional[int]:
+        return self._codes.get(category, {}).get(value)
+
+    def added(self) -> typing.List[dict]:
+        added, self._added = self._added, []
+        return added
+
+    def __len__(self):
+        return sum(len(codes) for codes in self._codes.values())
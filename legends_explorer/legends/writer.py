@@ -0,0 +1,73 @@
+import queue
+import threading
+import typing
+
+from legends_explorer.legends import LegendsConnection
+from legends_explorer.legends.profiler import profiler
+
+
+class BatchWriter:
+    def __init__(self, mongo: LegendsConnection, *, batch_size: int = 1000, queue_size: int = 8, workers: int = 1):
+        self._mongo = mongo
+        self._batch_size = batch_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._batches: typing.Dict[str, typing.List[dict]] = {}
+        self._counts: typing.Dict[str, int] = {}
+        self._error: typing.Optional[BaseException] = None
+        self._threads = [threading.Thread(target=self._run, name=f'legends-writer-{index}', daemon=True)
+                         for index in range(workers)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def write(self, name: str, entity: dict):
+        if name not in self._batches:
+            self._batches[name] = []
+        batch = self._batches[name]
+        batch.append(entity)
+        if len(batch) >= self._batch_size:
+            self._submit(name)
+
+    def flush(self, name: str):
+        if name in self._batches:
+            self._submit(name)
+
+    def close(self):
+        for name in list(self._batches):
+            self._submit(name)
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._raise_error()
+
+    def count(self, name: str):
+        return self._counts.get(name, 0)
+
+    def _submit(self, name: str):
+        self._raise_error()
+        batch = self._batches.pop(name)
+        if batch:
+            self._counts[name] = self._counts.get(name, 0) + len(batch)
+            self._queue.put((name, batch))
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                continue
+            name, batch = item
+            try:
+                with profiler.timer(name, 'insert'):
+                    self._mongo.db[name].insert_many(batch, ordered=False)
+                profiler.count(name, 'inserted', len(batch))
+            except BaseException as e:
+                self._error = e
@@ -0,0 +1,72 @@
+import random
+import unittest
+
+from legends_explorer.legends import Collection
+from legends_explorer.legends.types import Entity, Int, Str
+
+
+class StubWriter:
+    def __init__(self):
+        self.written = []
+        self.flushed = []
+
+    def write(self, name: str, document: dict):
+        self.written.append(document)
+
+    def flush(self, name: str):
+        self.flushed.append(name)
+
+
+class JoinTest(unittest.TestCase):
+    origins = [{'id': i, 'name': f'origin {i}', 'type': 'old'} for i in range(12)]
+    # legends_plus overrides part of the records and has a few of its own
+    overrides = [{'id': i, 'type': 'new'} for i in range(0, 16, 3)]
+    expected = {
+        **{i: {'id': i, 'name': f'origin {i}', 'type': 'new' if i % 3 == 0 else 'old'} for i in range(12)},
+        **{i: {'id': i, 'type': 'new'} for i in range(12, 16, 3)}
+    }
+
+    @staticmethod
+    def collection() -> Collection:
+        return Collection('figures', Entity('id', {'id': Int(), 'name': Str(), 'type': Str()}))
+
+    def orders(self):
+        # each file is read in order, its chunks are joined in any order relative to the other file's
+        events = {False: [('join', e) for e in self.origins] + [('complete', None)],
+                  True: [('join', e) for e in self.overrides] + [('complete', None)]}
+        yield [(True, event) for event in events[True]] + [(False, event) for event in events[False]]
+        yield [(False, event) for event in events[False]] + [(True, event) for event in events[True]]
+        rand = random.Random(0)
+        for _ in range(20):
+            streams = {override: list(stream) for override, stream in events.items()}
+            order = []
+            while streams[False] or streams[True]:
+                override = rand.choice([key for key, stream in streams.items() if stream])
+                order.append((override, streams[override].pop(0)))
+            yield order
+
+    @staticmethod
+    def run_order(collection: Collection, order, *, final: bool):
+        for override, (action, entity) in order:
+            if action == 'join':
+                collection.join(dict(entity), override=override, final=final)
+            else:
+                collection.complete(override=override, final=final)
+
+    def test_join(self):
+        for order in self.orders():
+            collection = self.collection()
+            self.run_order(collection, order, final=False)
+            self.assertEqual({e['id']: e for e in collection.entities()}, self.expected)
+
+    def test_join_final(self):
+        for order in self.orders():
+            collection = self.collection()
+            writer = StubWriter()
+            collection.stream_to(writer)
+            self.run_order(collection, order, final=True)
+            written = [e['id'] for e in writer.written]
+            self.assertEqual(sorted(written), sorted(set(written)), 'entities are written once')
+            self.assertEqual({e['id']: e for e in writer.written}, self.expected)
+            self.assertEqual(writer.flushed, ['figures'])
+            self.assertEqual(len(collection), 0)
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.backends import write_sample
+from legends_explorer.legends import definitions
+from legends_explorer.legends.parser import parse_chunk
+from legends_explorer.legends.reader import readers, get_reader, scan_document, split_section
+
+
+class ReadersTest(unittest.TestCase):
+    records = 200
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp_dir = tempfile.TemporaryDirectory()
+        cls.file_path = os.path.join(cls._tmp_dir.name, 'sample-legends.xml')
+        write_sample(cls.file_path, cls.records, seed=0)
+        cls.document = scan_document(cls.file_path).select(lambda tag: tag in definitions)
+        cls.expected = cls.parse(get_reader('etree'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp_dir.cleanup()
+
+    @classmethod
+    def parse(cls, reader):
+        parsed = {}
+        for tag, elem in reader.read_records(cls.document):
+            parsed.setdefault(tag, []).append(definitions[tag].root.parse(elem))
+        return parsed
+
+    def parse_chunks(self, backend: str, chunk_size: int):
+        parsed = {}
+        for section in self.document.sections:
+            chunks = split_section(self.document, section, chunk_size)
+            for chunk in chunks:
+                entities, _ = parse_chunk(chunk, backend=backend)
+                parsed.setdefault(section.tag, []).extend(entities)
+            if len(section) > chunk_size:
+                self.assertGreater(len(chunks), 1, section.tag)
+        return parsed
+
+    def backends(self):
+        for backend in readers:
+            reader = get_reader(backend)
+            if reader.name != backend:
+                # lxml is optional, get_reader falls back to etree
+                continue
+            yield backend, reader
+
+    def test_sample(self):
+        self.assertEqual(set(self.expected), set(definitions))
+        for tag, entities in self.expected.items():
+            self.assertEqual(len(entities), self.records, tag)
+
+    def test_backends_identical(self):
+        for backend, reader in self.backends():
+            with self.subTest(backend=backend):
+                self.assertEqual(self.parse(reader), self.expected)
+
+    def test_chunks_identical(self):
+        for backend, _ in self.backends():
+            for chunk_size in (1024, 16 * 1024):
+                with self.subTest(backend=backend, chunk_size=chunk_size):
+                    self.assertEqual(self.parse_chunks(backend, chunk_size), self.expected)
+
+
+class EncodingTest(unittest.TestCase):
+    names = ['Üristé Çog', 'Åblel Æsir', 'Ethéñ Ökrum', 'Bëlal Fûrgöl']
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp_dir = tempfile.TemporaryDirectory()
+        cls.file_path = os.path.join(cls._tmp_dir.name, 'cp437-legends.xml')
+        lines = ['<?xml version="1.0" encoding=\'CP437\'?>', '<df_world>', '<historical_figures>']
+        for key in range(40):
+            lines.extend(['<historical_figure>', f'<id>{key}</id>', f'<name>{cls.names[key % len(cls.names)]}</name>',
+                          '<race>DWARF</race>', '</historical_figure>'])
+        lines.extend(['</historical_figures>', '</df_world>', ''])
+        with open(cls.file_path, 'wb') as f:
+            f.write('\n'.join(lines).encode('cp437'))
+        cls.document = scan_document(cls.file_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp_dir.cleanup()
+
+    def test_declared_encoding(self):
+        self.assertEqual(self.document.encoding, 'cp437')
+
+    def test_backends_decode(self):
+        expected = [self.names[key % len(self.names)] for key in range(40)]
+        for backend in readers:
+            reader = get_reader(backend)
+            if reader.name != backend:
+                continue
+            with self.subTest(backend=backend):
+                names = [elem.find('name').text for _, elem in reader.read_records(self.document)]
+                self.assertEqual(names, expected)
+                section = self.document.sections[0]
+                chunks = split_section(self.document, section, 256)
+                self.assertGreater(len(chunks), 1)
+                entities = [entity for chunk in chunks for entity in parse_chunk(chunk, backend=backend)[0]]
+                self.assertEqual([entity['name'] for entity in entities], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+
+from legends_explorer.legends.types import Bool, Entity, GroupBy, GroupTree, Int, LinkToPreviousGroupBy, Str, Wrap
+
+
+def figure() -> Entity:
+    return Entity('id', {
+        'id': Int(), 'name': Str(), 'sphere': GroupBy('spheres', Str()),
+        'entity_link': GroupBy('entity_links', Entity('entity_id', {
+            'link_type': Str(), 'entity_id': Int(), 'link_strength': Int()
+        })),
+        'entity_position_link': LinkToPreviousGroupBy(
+            'entity_links', 'entity_position_link', Entity('entity_id', {
+                'position_profile_id': Int(), 'entity_id': Int(), 'start_year': Int()
+            })
+        ),
+        'pet': Wrap('creature', Str()), 'has_any_': GroupTree('has_any_', 1, Bool())
+    })
+
+
+class MergeTest(unittest.TestCase):
+    def test_entity(self):
+        merged = figure().merge({'id': 1, 'name': 'urist', 'pet': {'creature': 'cat'}},
+                                {'id': 1, 'name': ' ', 'birth_year': 12})
+        # blank strings of legends_plus do not replace the origin's
+        self.assertEqual(merged, {'id': 1, 'name': 'urist', 'pet': {'creature': 'cat'}, 'birth_year': 12})
+
+    def test_entity_keeps_origin(self):
+        origin = {'id': 1, 'spheres': ['war']}
+        override = {'id': 1, 'spheres': ['death']}
+        figure().merge(origin, override)
+        self.assertEqual(origin, {'id': 1, 'spheres': ['war']})
+        self.assertEqual(override, {'id': 1, 'spheres': ['death']})
+
+    def test_group_by_basic(self):
+        spheres = GroupBy('spheres', Str())
+        self.assertEqual(spheres.merge(['war', 'death', 'fire'], ['death', 'night']), ['war', 'fire', 'death', 'night'])
+        self.assertEqual(spheres.merge([], ['night']), ['night'])
+        self.assertEqual(spheres.merge(['war'], []), ['war'])
+
+    def test_group_by_entities(self):
+        origin = [{'entity_id': 1, 'link_type': 'member'}, {'entity_id': 2, 'link_type': 'enemy'}]
+        override = [{'entity_id': 2, 'link_strength': 40}, {'entity_id': 3, 'link_type': 'member'}]
+        self.assertEqual(figure().merge({'id': 1, 'entity_links': origin}, {'id': 1, 'entity_links': override}), {
+            'id': 1, 'entity_links': [
+                {'entity_id': 1, 'link_type': 'member'},
+                {'entity_id': 2, 'link_type': 'enemy', 'link_strength': 40},
+                {'entity_id': 3, 'link_type': 'member'}
+            ]
+        })
+
+    def test_group_by_duplicated_ids(self):
+        links = GroupBy('entity_links', Entity('entity_id', {'link_type': Str(), 'entity_id': Int()}))
+        origin = [{'entity_id': 1, 'link_type': 'member'}, {'entity_id': 1, 'link_type': 'former member'},
+                  {'entity_id': 1, 'link_type': 'enemy'}]
+        override = [{'entity_id': 1, 'link_strength': 10}, {'entity_id': 1, 'link_strength': 20}]
+        # items sharing an id are paired in order, the third origin link has no override
+        self.assertEqual(links.merge(origin, override), [
+            {'entity_id': 1, 'link_type': 'member', 'link_strength': 10},
+            {'entity_id': 1, 'link_type': 'former member', 'link_strength': 20},
+            {'entity_id': 1, 'link_type': 'enemy'}
+        ])
+        self.assertEqual(links.merge(origin[:1], override), [
+            {'entity_id': 1, 'link_type': 'member', 'link_strength': 10},
+            {'entity_id': 1, 'link_strength': 20}
+        ])
+
+    def test_group_by_links(self):
+        origin = [{'entity_id': 1, 'link_type': 'member',
+                   'entity_position_link': {'position_profile_id': 3, 'entity_id': 1, 'start_year': 10}}]
+        override = [{'entity_id': 1, 'link_strength': 5,
+                     'entity_position_link': {'entity_id': 1, 'start_year': 12}}]
+        merged = figure().merge({'id': 1, 'entity_links': origin}, {'id': 1, 'entity_links': override})
+        self.assertEqual(merged['entity_links'], [{
+            'entity_id': 1, 'link_type': 'member', 'link_strength': 5,
+            'entity_position_link': {'position_profile_id': 3, 'entity_id': 1, 'start_year': 12}
+        }])
+
+    def test_group_by_links_one_side(self):
+        link = {'position_profile_id': 3, 'entity_id': 1, 'start_year': 10}
+        merged = figure().merge({'id': 1, 'entity_links': [{'entity_id': 1, 'entity_position_link': link}]},
+                                {'id': 1, 'entity_links': [{'entity_id': 1, 'link_strength': 5}]})
+        self.assertEqual(merged['entity_links'], [{'entity_id': 1, 'entity_position_link': link, 'link_strength': 5}])
+
+    def test_group_tree(self):
+        merged = figure().merge(
+            {'id': 1, 'has_any': {'benign': True, 'savage': {'evil': True}}},
+            {'id': 1, 'has_any': {'savage': {'good': True}, 'flier': True}}
+        )
+        self.assertEqual(merged['has_any'], {'benign': True, 'savage': {'evil': True, 'good': True}, 'flier': True})
+
+    def test_wrap(self):
+        pet = Wrap('creature', Str())
+        self.assertEqual(pet.merge({'creature': 'cat'}, {'creature': 'dog'}), {'creature': 'dog'})
+        self.assertEqual(pet.merge({'creature': 'cat'}, {'creature': ''}), {'creature': 'cat'})
+        self.assertEqual(figure().merge({'id': 1, 'pet': {'creature': 'cat'}}, {'id': 1, 'pet': {'creature': 'dog'}}),
+                         {'id': 1, 'pet': {'creature': 'dog'}})